@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academia_project.settings')
 
 application = get_asgi_application()
+
+# Como en wsgi.py: el barrendero solo arranca en los procesos que sirven peticiones
+from simulador.mantenimiento import iniciar_barrendero  # noqa: E402
+
+iniciar_barrendero()
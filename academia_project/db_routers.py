@@ -0,0 +1,106 @@
+"""
+Router de réplica de lectura para las consultas de clasificaciones y estadísticas.
+
+Solo se activa si existe el alias 'replica' (DATABASE_REPLICA_URL en el .env).
+Las vistas marcan con lecturas_analiticas() los bloques de solo lectura
+pesados (escalafón, estadísticas, ranking de la portada) y esas lecturas van
+a la réplica. Todo lo demás, y cualquier escritura, sigue en 'default'.
+
+Lectura de lo propio escrito: ReplicaMiddleware vigila las sentencias que
+se ejecutan en 'default'. En cuanto la petición escribe algo, el resto de sus
+lecturas vuelve a 'default', y durante REPLICA_PAUSA_SEGUNDOS las peticiones
+siguientes del mismo navegador también (cookie), para que la réplica tenga
+tiempo de ponerse al día (p.ej. estadísticas justo después de entregar).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+ALIAS_REPLICA = 'replica'
+COOKIE_PAUSA = 'replica_pausa'
+
+_analitica = ContextVar('lecturas_analiticas', default=False)
+_escrito = ContextVar('escrito_en_peticion', default=False)
+
+SENTENCIAS_ESCRITURA = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def hay_replica():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+@contextmanager
+def lecturas_analiticas():
+    """Las lecturas de este bloque pueden ir a la réplica (si la hay y no se ha escrito)."""
+    token = _analitica.set(True)
+    try:
+        yield
+    finally:
+        _analitica.reset(token)
+
+
+def marcar_escritura():
+    _escrito.set(True)
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        if not _analitica.get() or _escrito.get() or not hay_replica():
+            return None
+        # Dentro de una transacción en 'default' se lee lo que ella ve
+        if connections['default'].in_atomic_block:
+            return None
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y principal tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS_REPLICA
+
+
+def _es_escritura(sql):
+    return sql.lstrip()[:7].upper().startswith(SENTENCIAS_ESCRITURA)
+
+
+class ReplicaMiddleware:
+    """Detecta escrituras en la petición y mantiene al navegador en 'default' un rato después."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pausa = getattr(settings, 'REPLICA_PAUSA_SEGUNDOS', 5)
+
+    def __call__(self, request):
+        try:
+            escrito_antes = float(request.COOKIES.get(COOKIE_PAUSA, 0)) > time.time()
+        except ValueError:
+            escrito_antes = False
+
+        escrituras = []
+
+        def vigilar(execute, sql, params, many, context):
+            if not escrituras and _es_escritura(sql):
+                escrituras.append(sql)
+                marcar_escritura()
+            return execute(sql, params, many, context)
+
+        token = _escrito.set(escrito_antes)
+        try:
+            with connections['default'].execute_wrapper(vigilar):
+                response = self.get_response(request)
+        finally:
+            _escrito.reset(token)
+
+        if escrituras:
+            response.set_cookie(
+                COOKIE_PAUSA, str(time.time() + self.pausa),
+                max_age=self.pausa, httponly=True, samesite='Lax',
+            )
+        return response
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'academia_project.settings')
 
 application = get_wsgi_application()
+
+# Mantenimiento periódico en segundo plano (desactivado por defecto). Se arranca
+# aquí y no en AppConfig.ready() para que migrate, shell, los tests y los comandos
+# de gestión no levanten el hilo: solo los procesos que sirven peticiones.
+from simulador.mantenimiento import iniciar_barrendero  # noqa: E402
+
+iniciar_barrendero()
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Curso, Tema, Pregunta, Opcion, Perfil, Resultado, HistorialDescuento, DocumentoContexto
+from .models import Curso, Tema, Pregunta, Opcion, Perfil, Resultado, HistorialDescuento, DocumentoContexto, ResumenDiario
 
 # 1. Configuración para ver el Perfil DENTRO del Usuario
 class PerfilInline(admin.StackedInline):
@@ -24,7 +24,7 @@ class CursoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'precio')
 
 class TemaAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'curso')
+    list_display = ('nombre', 'curso', 'num_preguntas')
     list_filter = ('curso',)
 
 class OpcionInline(admin.TabularInline):
@@ -61,6 +61,20 @@ class DocumentoContextoAdmin(admin.ModelAdmin):
             else:
                 self.message_user(request, f'{doc.nombre} ya tiene texto o no tiene PDF')
 
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    # Filas generadas por `manage.py resumir_actividad_diaria`; solo lectura
+    list_display = ('fecha', 'usuario', 'tests', 'nota_media', 'preguntas')
+    list_filter = (('usuario', admin.EmptyFieldListFilter),)
+    date_hierarchy = 'fecha'
+    search_fields = ('usuario__username',)
+    list_select_related = ('usuario',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Registro
 admin.site.register(Curso, CursoAdmin)
 admin.site.register(Tema, TemaAdmin)
@@ -68,4 +82,5 @@ admin.site.register(Pregunta, PreguntaAdmin)
 admin.site.register(Resultado, ResultadoAdmin)
 admin.site.register(HistorialDescuento, HistorialDescuentoAdmin)
 admin.site.register(DocumentoContexto, DocumentoContextoAdmin)
+admin.site.register(ResumenDiario, ResumenDiarioAdmin)
 # Ya no hace falta registrar Perfil suelto porque sale dentro de Usuario
\ No newline at end of file
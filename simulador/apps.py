@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class SimuladorConfig(AppConfig):
     name = 'simulador'
+
+    def ready(self):
+        # Tras migrate se construye el índice del Instructor IA si está vacío (primer despliegue)
+        from .indice_texto import indexar_si_vacio
+        post_migrate.connect(indexar_si_vacio, sender=self)
@@ -0,0 +1,51 @@
+"""
+Orden de preguntas y opciones derivado de la semilla de cada examen.
+
+No se guarda ningún orden: a partir de Examen.semilla un generador splitmix64
+produce siempre la misma permutación (Fisher-Yates), así que el examen, la
+corrección y la revisión de resultados ven exactamente el mismo orden sin
+filas extra. Las opciones de cada pregunta se barajan con una subsemilla
+derivada de la semilla del examen y del id de la pregunta.
+
+Semilla 0 = sin barajar (exámenes anteriores a este cambio).
+"""
+import secrets
+
+_MASCARA_64 = (1 << 64) - 1
+_INCREMENTO = 0x9E3779B97F4A7C15
+
+
+def mezclar64(x):
+    """Finalizador de splitmix64: un entero de 64 bits bien repartido a partir de x."""
+    x = (x + _INCREMENTO) & _MASCARA_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASCARA_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASCARA_64
+    return x ^ (x >> 31)
+
+
+def nueva_semilla():
+    # 63 bits: cabe en un PositiveBigIntegerField en cualquier base de datos
+    return secrets.randbits(63) or 1
+
+
+def barajar(elementos, semilla):
+    """Copia de `elementos` en el orden que fija `semilla` (Fisher-Yates + splitmix64)."""
+    resultado = list(elementos)
+    if not semilla:
+        return resultado
+    estado = semilla
+    for i in range(len(resultado) - 1, 0, -1):
+        estado = (estado + _INCREMENTO) & _MASCARA_64
+        j = mezclar64(estado) % (i + 1)
+        resultado[i], resultado[j] = resultado[j], resultado[i]
+    return resultado
+
+
+def ordenar_snapshot(snapshot, semilla):
+    """Aplica el orden del examen a un snapshot (tupla de PreguntaSnapshot)."""
+    if not semilla:
+        return snapshot
+    return tuple(
+        p._replace(opciones=tuple(barajar(p.opciones, semilla ^ mezclar64(p.id))))
+        for p in barajar(snapshot, semilla)
+    )
@@ -0,0 +1,78 @@
+"""
+Temas que se ofrecen en configurar_test, agrupados por materia.
+
+Tema.num_preguntas es un contador desnormalizado: lo mantienen las señales
+de Pregunta (alta, baja y cambio de tema, también desde el admin y los
+importadores) y recontar_preguntas() lo rehace con un único UPDATE cuando
+algo lo salta (.update(), bulk_create...). La página lee una sola consulta
+de temas con preguntas, agrupada por materia en Python y cacheada hasta que
+cambia una pregunta o un tema.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Pregunta, Tema
+
+TEMAS_KEY = 'simulador:catalogo:temas'
+TEMAS_TIMEOUT = 60 * 10  # Con caché por proceso, los demás workers tardan como mucho esto en enterarse
+
+TemaOfertado = namedtuple('TemaOfertado', ['id', 'nombre', 'num_preguntas'])
+
+
+def temas_por_materia():
+    """{materia: [TemaOfertado, ...]} de los temas con al menos una pregunta."""
+    grupos = cache.get(TEMAS_KEY)
+    if grupos is None:
+        grupos = {materia: [] for materia, _ in Tema.MATERIAS_CHOICES}
+        filas = (
+            Tema.objects
+            .filter(num_preguntas__gt=0)
+            .order_by(*Tema._meta.ordering)
+            .values_list('id', 'nombre', 'materia', 'num_preguntas')
+        )
+        for tema_id, nombre, materia, num_preguntas in filas:
+            # Los temas antiguos sin materia se muestran con los de Cabo
+            grupos.setdefault(materia or 'CABO', []).append(TemaOfertado(tema_id, nombre, num_preguntas))
+        cache.set(TEMAS_KEY, grupos, TEMAS_TIMEOUT)
+    return grupos
+
+
+def invalidar_temas():
+    cache.delete(TEMAS_KEY)
+
+
+def mover_preguntas(desde_tema_id, hacia_tema_id, cantidad=1):
+    """Pasa `cantidad` preguntas de un tema a otro en los contadores (None = alta o baja)."""
+    if desde_tema_id is not None:
+        Tema.objects.filter(id=desde_tema_id, num_preguntas__gte=cantidad).update(
+            num_preguntas=F('num_preguntas') - cantidad
+        )
+    if hacia_tema_id is not None:
+        Tema.objects.filter(id=hacia_tema_id).update(num_preguntas=F('num_preguntas') + cantidad)
+    invalidar_temas()
+
+
+def recontar_preguntas(temas_ids=None):
+    """Recalcula Tema.num_preguntas desde la tabla de preguntas. Devuelve cuántos temas corrigió."""
+    conteo = (
+        Pregunta.objects
+        .filter(tema=OuterRef('pk'))
+        .order_by()
+        .values('tema')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    temas = Tema.objects.all() if temas_ids is None else Tema.objects.filter(id__in=temas_ids)
+    corregidos = list(
+        temas
+        .annotate(real=Coalesce(Subquery(conteo), 0))
+        .exclude(num_preguntas=F('real'))
+        .values_list('id', flat=True)
+    )
+    if corregidos:
+        Tema.objects.filter(id__in=corregidos).update(num_preguntas=Coalesce(Subquery(conteo), 0))
+    invalidar_temas()
+    return len(corregidos)
@@ -0,0 +1,180 @@
+"""
+Clasificaciones de alumnos.
+
+Clasificación general por preguntas respondidas (portada y estadísticas):
+
+- top(): los TAMANO_TOP primeros, cacheados. Una entrega solo invalida la
+  caché si la nueva puntuación puede entrar en el top.
+- mi_posicion(): COUNT de los perfiles con más preguntas respondidas sobre
+  el índice perfil_preguntas_respondidas. Es la misma para todos los workers
+  y no guarda nada en memoria, así que no hay que reconstruir ni bloquear.
+- total_alumnos(): número de perfiles, cacheado TOP_TIMEOUT segundos.
+
+Escalafón por nota media (vista escalafon): tabla EscalafonAlumno con una
+fila por alumno que se actualiza en la propia entrega (registrar_nota). El
+top sale de un índice sobre nota_media y la posición de un COUNT indexado.
+
+Ventanas semanal y mensual (?ventana=semana|mes en escalafon y portada): cubos
+EscalafonPeriodo por (tipo, inicio, alumno) que la entrega actualiza igual que
+el escalafón histórico. Cada ranking es una lectura indexada de un solo cubo y
+los cubos viejos se borran enteros (purgar_periodos).
+"""
+from datetime import timedelta
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import EscalafonAlumno, EscalafonPeriodo, Perfil, generar_alias
+
+TOP_KEY = 'simulador:clasificacion:top'
+TOTAL_KEY = 'simulador:clasificacion:total'
+
+TAMANO_TOP = 50
+TOP_TIMEOUT = 60 * 10
+
+# Valores de ?ventana= -> tipo de cubo
+VENTANAS = {'semana': 'SEMANA', 'mes': 'MES'}
+# Antigüedad a partir de la cual se borra un cubo entero
+CONSERVAR_PERIODOS = {'SEMANA': timedelta(weeks=8), 'MES': timedelta(days=366)}
+
+Puesto = namedtuple('Puesto', ['usuario_id', 'username', 'rango', 'preguntas_respondidas'])
+
+
+def top():
+    puestos = cache.get(TOP_KEY)
+    if puestos is None:
+        puestos = [
+            Puesto(p.usuario_id, p.usuario.username, p.rango, p.preguntas_respondidas)
+            for p in Perfil.objects.select_related('usuario')
+            .only('usuario_id', 'usuario__username', 'rango', 'preguntas_respondidas')
+            .order_by('-preguntas_respondidas', 'id')[:TAMANO_TOP]
+        ]
+        cache.set(TOP_KEY, puestos, TOP_TIMEOUT)
+    return puestos
+
+
+def mi_posicion(perfil):
+    """1 + número de alumnos con más preguntas respondidas (los empates comparten puesto)."""
+    return Perfil.objects.filter(preguntas_respondidas__gt=perfil.preguntas_respondidas).count() + 1
+
+
+def total_alumnos():
+    total = cache.get(TOTAL_KEY)
+    if total is None:
+        total = Perfil.objects.count()
+        cache.set(TOTAL_KEY, total, TOP_TIMEOUT)
+    return total
+
+
+def anotar_respuestas(nueva):
+    """Tras una entrega: invalida el top si la nueva puntuación del alumno puede entrar."""
+    puestos = cache.get(TOP_KEY)
+    if puestos is not None and (len(puestos) < TAMANO_TOP or nueva >= puestos[-1].preguntas_respondidas):
+        cache.delete(TOP_KEY)
+
+
+def _acumular_nota(filas, nota, preguntas=0):
+    """UPDATE con F() de las filas de escalafón dadas; devuelve cuántas existían."""
+    tests = F('tests') + 1
+    suma = F('suma_notas') + nota
+    campos = {
+        'tests': tests,
+        'suma_notas': suma,
+        'nota_media': suma / Cast(tests, FloatField()),
+    }
+    if preguntas:
+        campos['preguntas'] = F('preguntas') + preguntas
+    return filas.update(**campos)
+
+
+def registrar_nota(usuario, nota):
+    """Suma un test al escalafón del alumno. Llamar dentro de la transacción de la entrega."""
+    if not _acumular_nota(EscalafonAlumno.objects.filter(usuario=usuario), nota):
+        EscalafonAlumno.objects.create(
+            usuario=usuario,
+            alias=generar_alias(usuario.username, usuario.id),
+            tests=1,
+            suma_notas=nota,
+            nota_media=nota,
+        )
+
+
+def inicio_periodo(tipo, fecha=None):
+    fecha = fecha or timezone.localdate()
+    if tipo == 'SEMANA':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+
+def registrar_periodos(usuario, nota, preguntas):
+    """Suma un test a los cubos de la semana y el mes en curso (dentro de la entrega)."""
+    hoy = timezone.localdate()
+    for tipo in VENTANAS.values():
+        inicio = inicio_periodo(tipo, hoy)
+        filas = EscalafonPeriodo.objects.filter(tipo=tipo, inicio=inicio, usuario=usuario)
+        if not _acumular_nota(filas, nota, preguntas):
+            EscalafonPeriodo.objects.create(
+                tipo=tipo,
+                inicio=inicio,
+                usuario=usuario,
+                alias=generar_alias(usuario.username, usuario.id),
+                tests=1,
+                suma_notas=nota,
+                nota_media=nota,
+                preguntas=preguntas,
+            )
+
+
+def purgar_periodos():
+    """Borra los cubos semanales y mensuales caducados. Devuelve cuántas filas borró."""
+    hoy = timezone.localdate()
+    borradas = 0
+    for tipo, conservar in CONSERVAR_PERIODOS.items():
+        borradas += EscalafonPeriodo.objects.filter(tipo=tipo, inicio__lt=hoy - conservar).delete()[0]
+    return borradas
+
+
+def ventana_desde(valor):
+    """Tipo de cubo para un valor de ?ventana= (None = histórico)."""
+    return VENTANAS.get(valor)
+
+
+def _filas_escalafon(tipo=None):
+    if tipo is None:
+        return EscalafonAlumno.objects.all()
+    return EscalafonPeriodo.objects.filter(tipo=tipo, inicio=inicio_periodo(tipo))
+
+
+def fila_escalafon(usuario, tipo=None):
+    return _filas_escalafon(tipo).filter(usuario=usuario).first()
+
+
+def escalafon_top(n=10, tipo=None):
+    return list(_filas_escalafon(tipo).order_by('-nota_media', 'usuario_id')[:n])
+
+
+def posicion_escalafon(fila, tipo=None):
+    return _filas_escalafon(tipo).filter(nota_media__gt=fila.nota_media).count() + 1
+
+
+def total_escalafon(tipo=None):
+    return _filas_escalafon(tipo).count()
+
+
+def top_periodo(tipo, n=TAMANO_TOP):
+    """Clasificación por preguntas respondidas dentro del cubo en curso (portada)."""
+    return [
+        Puesto(*fila)
+        for fila in _filas_escalafon(tipo)
+        .order_by('-preguntas', 'usuario_id')
+        .values_list('usuario_id', 'usuario__username', 'usuario__perfil__rango', 'preguntas')[:n]
+    ]
+
+
+def posicion_periodo(usuario, tipo):
+    fila = fila_escalafon(usuario, tipo)
+    preguntas = fila.preguntas if fila else 0
+    return _filas_escalafon(tipo).filter(preguntas__gt=preguntas).count() + 1
@@ -0,0 +1,128 @@
+"""
+Historial de respuestas e índice de puntos débiles de cada alumno.
+
+Al entregar un test se guarda una fila de RespuestaUsuario por pregunta con un
+único bulk_create, y se actualizan los contadores precalculados de
+DebilidadPregunta y DebilidadTema (intentos, fallos y tasa de fallo). Así el
+modo "repaso de fallos" y las estadísticas por tema leen una tabla pequeña e
+indexada en lugar de recorrer todo el historial de Resultados.
+
+Además se lleva la dificultad observada de cada pregunta para todos los
+alumnos (Pregunta.veces_respondida / veces_fallada) con un único UPDATE por
+entrega.
+"""
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Cast
+
+from .models import DebilidadPregunta, DebilidadTema, Pregunta, RespuestaUsuario
+
+MIN_INTENTOS_PUNTO_DEBIL = 5  # Respuestas mínimas para que un tema cuente como punto débil
+
+
+def _por_valor(campo, valores, default=None, output_field=None):
+    """CASE que da a cada fila su valor de `valores` ({id: valor}), agrupando ids con el mismo valor."""
+    grupos = {}
+    for obj_id, valor in valores.items():
+        grupos.setdefault(valor, []).append(obj_id)
+    return Case(
+        *[When(**{f"{campo}_id__in": ids}, then=Value(valor)) for valor, ids in grupos.items()],
+        default=default if default is not None else Value(0),
+        output_field=output_field or IntegerField(),
+    )
+
+
+def _acumular(modelo, usuario, campo, conteos, extra=None):
+    """
+    Suma `conteos` ({id: (intentos, fallos)}) a las filas de `modelo` del
+    alumno: un INSERT que crea a cero las que falten y un único UPDATE con F(),
+    así dos entregas a la vez no se pisan los contadores.
+    `extra(id)` da campos fijos de la fila (p. ej. el tema de la pregunta).
+    """
+    if not conteos:
+        return
+    fijos = {obj_id: extra(obj_id) for obj_id in conteos} if extra else {}
+    modelo.objects.bulk_create(
+        [modelo(usuario=usuario, **{f"{campo}_id": obj_id}, **fijos.get(obj_id, {})) for obj_id in conteos],
+        ignore_conflicts=True,
+    )
+
+    intentos = F('intentos') + _por_valor(campo, {obj_id: n for obj_id, (n, _) in conteos.items()})
+    fallos = F('fallos') + _por_valor(campo, {obj_id: n for obj_id, (_, n) in conteos.items()})
+    campos = {
+        'intentos': intentos,
+        'fallos': fallos,
+        'tasa_fallo': Cast(fallos, FloatField()) / Cast(intentos, FloatField()),
+    }
+    for nombre in next(iter(fijos.values()), {}):
+        campos[nombre] = _por_valor(campo, {obj_id: valores[nombre] for obj_id, valores in fijos.items()},
+                                    default=F(nombre), output_field=modelo._meta.get_field(nombre))
+    modelo.objects.filter(usuario=usuario, **{f"{campo}_id__in": list(conteos)}).update(**campos)
+
+
+def registrar_respuestas(usuario, examen, correccion, temas):
+    """
+    Apunta el detalle de una corrección en el historial y en el índice de
+    puntos débiles. `temas` es {pregunta_id: tema_id}. Debe llamarse dentro
+    de la transacción de la entrega.
+    """
+    RespuestaUsuario.objects.bulk_create([
+        RespuestaUsuario(
+            usuario=usuario,
+            examen=examen,
+            pregunta_id=pregunta_id,
+            opcion_id=opcion_id,
+            correcta=es_correcta,
+        )
+        for pregunta_id, opcion_id, es_correcta in correccion.detalle
+        if pregunta_id in temas  # Se ignoran preguntas borradas mientras se hacía el test
+    ])
+
+    por_pregunta = {}
+    por_tema = {}
+    for pregunta_id, _, es_correcta in correccion.detalle:
+        tema_id = temas.get(pregunta_id)
+        if tema_id is None:
+            continue
+        fallo = 0 if es_correcta else 1
+        por_pregunta[pregunta_id] = (1, fallo)
+        intentos, fallos = por_tema.get(tema_id, (0, 0))
+        por_tema[tema_id] = (intentos + 1, fallos + fallo)
+
+    _acumular(DebilidadPregunta, usuario, 'pregunta', por_pregunta,
+              extra=lambda pregunta_id: {'tema_id': temas[pregunta_id]})
+    _acumular(DebilidadTema, usuario, 'tema', por_tema)
+
+    falladas = [pregunta_id for pregunta_id, (_, fallo) in por_pregunta.items() if fallo]
+    Pregunta.objects.filter(id__in=list(por_pregunta)).update(
+        veces_respondida=F('veces_respondida') + 1,
+        veces_fallada=F('veces_fallada') + Case(When(id__in=falladas, then=Value(1)), default=Value(0)),
+    )
+
+
+def seleccionar_repaso(usuario, temas_ids, cantidad):
+    """Ids de las preguntas más falladas por el alumno en esos temas (una consulta)."""
+    return list(
+        DebilidadPregunta.objects
+        .filter(usuario=usuario, tema_id__in=temas_ids, fallos__gt=0)
+        .order_by('-tasa_fallo', '-fallos', 'pregunta_id')
+        .values_list('pregunta_id', flat=True)[:cantidad]
+    )
+
+
+def puntos_debiles(usuario, cantidad=5):
+    """Temas y preguntas que más falla el alumno (dos consultas indexadas)."""
+    temas = list(
+        DebilidadTema.objects
+        .filter(usuario=usuario, intentos__gte=MIN_INTENTOS_PUNTO_DEBIL, fallos__gt=0)
+        .select_related('tema')
+        .order_by('-tasa_fallo')[:cantidad]
+    )
+    preguntas = list(
+        DebilidadPregunta.objects
+        .filter(usuario=usuario, fallos__gt=0)
+        .select_related('pregunta')
+        .only('intentos', 'fallos', 'tasa_fallo', 'pregunta__enunciado',
+              'pregunta__veces_respondida', 'pregunta__veces_fallada')
+        .order_by('-tasa_fallo', '-fallos')[:cantidad]
+    )
+    return temas, preguntas
@@ -0,0 +1,62 @@
+"""
+Resumen precalculado de las estadísticas de cada alumno.
+
+La página de estadísticas lee una sola fila (EstadisticasUsuario, por clave
+primaria) en lugar de contar y promediar todos los Resultados del alumno.
+La fila se actualiza dentro de la transacción de cada entrega.
+"""
+from .models import EstadisticasUsuario, Tema
+
+ULTIMAS_GUARDADAS = 10  # Intentos que se guardan para el gráfico y el historial
+
+
+def registrar_estadisticas(usuario, resultado, correccion, materias, tema_nombre=''):
+    """
+    Suma una entrega al resumen del alumno. `materias` es {pregunta_id: materia}.
+    Llamar dentro de la transacción de la entrega (bloquea la fila del alumno).
+    """
+    stats, _ = EstadisticasUsuario.objects.select_for_update().get_or_create(usuario=usuario)
+
+    stats.intentos += 1
+    stats.suma_notas += resultado.nota
+    stats.nota_media = stats.suma_notas / stats.intentos
+    stats.mejor_nota = max(stats.mejor_nota, resultado.nota) if stats.intentos > 1 else resultado.nota
+
+    for pregunta_id, opcion_id, es_correcta in correccion.detalle:
+        if pregunta_id not in materias:
+            continue  # Pregunta borrada mientras se hacía el test
+        # Los temas sin materia se ofrecen como CABO (catalogo.temas_por_materia)
+        materia = materias[pregunta_id] or 'CABO'
+        cuenta = stats.por_materia.setdefault(materia, {'aciertos': 0, 'fallos': 0, 'blancos': 0})
+        if es_correcta:
+            cuenta['aciertos'] += 1
+        elif opcion_id is None:
+            cuenta['blancos'] += 1
+        else:
+            cuenta['fallos'] += 1
+
+    stats.ultimas = (stats.ultimas + [{
+        'fecha': resultado.fecha.isoformat(),
+        'tema': tema_nombre,
+        'nota': round(resultado.nota, 2),
+        'aciertos': resultado.aciertos,
+        'fallos': resultado.fallos,
+    }])[-ULTIMAS_GUARDADAS:]
+    stats.save()
+    return stats
+
+
+def resumen_materias(stats):
+    """Filas para la tabla de rendimiento por materia, con el nombre legible."""
+    nombres = dict(Tema.MATERIAS_CHOICES)
+    filas = []
+    for materia, cuenta in sorted(stats.por_materia.items()):
+        respondidas = cuenta['aciertos'] + cuenta['fallos'] + cuenta['blancos']
+        filas.append({
+            'materia': nombres.get(materia, materia),
+            'aciertos': cuenta['aciertos'],
+            'fallos': cuenta['fallos'],
+            'blancos': cuenta['blancos'],
+            'porcentaje': round(cuenta['aciertos'] / respondidas * 100) if respondidas else 0,
+        })
+    return filas
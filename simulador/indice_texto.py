@@ -0,0 +1,259 @@
+"""
+Índice invertido con puntuación BM25 para el contexto del Instructor IA.
+
+Los documentos de contexto activos y el texto de los temas se parten en
+pasajes (párrafos o artículos) y de cada pasaje se guardan sus términos en
+AparicionTermino. Una búsqueda solo lee las apariciones de los términos de
+la pregunta, así que su coste depende de cuántos pasajes contienen esos
+términos y no del tamaño del temario.
+
+El índice se actualiza al guardar o borrar un DocumentoContexto o un Tema
+(señales en models.py) y se rehace entero con `manage.py indexar_contexto`.
+Tras un migrate con el índice vacío (el primer despliegue) se construye solo
+(indexar_si_vacio, conectado a post_migrate en apps.py).
+
+Los números sueltos no se indexan; tras "artículo" o "art." se guardan
+pegados al prefijo ('art14'), así una pregunta por "el artículo 14" encuentra
+ese artículo y no cualquier pasaje con un 14.
+"""
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, namedtuple
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Avg, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AparicionTermino, DocumentoContexto, PasajeIndice, Tema, TerminoIndice
+
+logger = logging.getLogger(__name__)
+
+ESTADISTICAS_KEY = 'simulador:indice_texto:estadisticas'
+ESTADISTICAS_TIMEOUT = 60 * 10
+
+# Parámetros habituales de BM25
+K1 = 1.2
+B = 0.75
+
+MIN_CARACTERES_PASAJE = 50
+MAX_CARACTERES_PASAJE = 1200
+MIN_LONGITUD_TERMINO = 4
+MAX_LONGITUD_TERMINO = 64
+
+STOP_WORDS = {
+    'el', 'la', 'los', 'las', 'de', 'en', 'que', 'es', 'un', 'una', 'por', 'para', 'con', 'sin',
+    'sobre', 'y', 'a', 'o', 'cual', 'cuantos', 'cuantas', 'como', 'cuando', 'donde', 'este', 'esta',
+    'estos', 'estas', 'entre', 'desde', 'hasta', 'pero', 'porque', 'segun', 'sera', 'seran', 'tiene',
+    'tienen', 'todo', 'todos', 'toda', 'todas', 'otro', 'otra', 'otros', 'otras', 'dicho', 'dicha',
+}
+# Palabras tras las que un número es un término ("artículo 14" -> 'art14')
+PREFIJOS_ARTICULO = {'art', 'articulo', 'articulos'}
+
+Coincidencia = namedtuple('Coincidencia', ['pasaje', 'puntuacion'])
+
+# Párrafos, o un bloque por artículo (el encabezado se queda en su pasaje)
+_SEPARADOR_BLOQUES = re.compile(r'\n\s*\n|(?=\bArt(?:ículo|\.)\s*\d+)')
+_PALABRA = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para que 'artículo' y 'articulo' coincidan."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    terminos = []
+    anterior = None
+    for palabra in _PALABRA.findall(normalizar(texto)):
+        if palabra.isdigit():
+            if anterior in PREFIJOS_ARTICULO:
+                terminos.append(f'art{palabra}')
+        elif MIN_LONGITUD_TERMINO <= len(palabra) <= MAX_LONGITUD_TERMINO and palabra not in STOP_WORDS:
+            terminos.append(palabra)
+        anterior = palabra
+    return terminos
+
+
+def partir_pasajes(texto):
+    """Bloques de texto con contenido; los muy largos se cortan en trozos de MAX_CARACTERES_PASAJE."""
+    pasajes = []
+    for bloque in _SEPARADOR_BLOQUES.split(texto or ''):
+        bloque = bloque.strip()
+        if len(bloque) < MIN_CARACTERES_PASAJE:
+            continue
+        while len(bloque) > MAX_CARACTERES_PASAJE:
+            corte = bloque.rfind(' ', 0, MAX_CARACTERES_PASAJE)
+            if corte < MAX_CARACTERES_PASAJE // 2:
+                corte = MAX_CARACTERES_PASAJE
+            pasajes.append(bloque[:corte].strip())
+            bloque = bloque[corte:].strip()
+        if len(bloque) >= MIN_CARACTERES_PASAJE:
+            pasajes.append(bloque)
+    return pasajes
+
+
+# --- Escritura del índice ---
+
+def _recalcular_df(terminos_ids):
+    """Rehace el df de los términos tocados y borra los que ya no aparecen en ningún pasaje."""
+    if not terminos_ids:
+        return
+    conteo = (
+        AparicionTermino.objects
+        .filter(termino=OuterRef('pk'))
+        .order_by()
+        .values('termino')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    terminos = TerminoIndice.objects.filter(id__in=terminos_ids)
+    terminos.update(df=Coalesce(Subquery(conteo), 0))
+    terminos.filter(df=0).delete()
+
+
+def _borrar_pasajes(pasajes):
+    """Borra los pasajes dados y devuelve los ids de los términos que aparecían en ellos."""
+    terminos_ids = set(
+        AparicionTermino.objects.filter(pasaje__in=pasajes).values_list('termino_id', flat=True).distinct()
+    )
+    pasajes.delete()
+    return terminos_ids
+
+
+def _indexar(texto, titulo, origen, copias):
+    """
+    Sustituye los pasajes de un origen ({'documento': ...} o {'tema': ...})
+    por los de `texto`. `copias` son los campos de filtrado (curso, materia).
+    """
+    with transaction.atomic():
+        tocados = _borrar_pasajes(PasajeIndice.objects.filter(**origen))
+
+        terminos_titulo = tokenizar(titulo)
+        pasajes = []
+        conteos = []
+        for orden, pasaje in enumerate(partir_pasajes(texto)):
+            # El título cuenta en cada pasaje: una pregunta que lo nombra pesa más
+            terminos = Counter(tokenizar(pasaje) + terminos_titulo)
+            if not terminos:
+                continue
+            pasajes.append(PasajeIndice(
+                orden=orden, texto=pasaje, longitud=sum(terminos.values()), **origen, **copias
+            ))
+            conteos.append(terminos)
+
+        if pasajes:
+            PasajeIndice.objects.bulk_create(pasajes, batch_size=500)
+
+            vocabulario = set().union(*conteos)
+            TerminoIndice.objects.bulk_create(
+                [TerminoIndice(termino=t) for t in vocabulario], batch_size=1000, ignore_conflicts=True
+            )
+            ids = {}
+            vocabulario = list(vocabulario)
+            for i in range(0, len(vocabulario), 500):
+                ids.update(
+                    TerminoIndice.objects.filter(termino__in=vocabulario[i:i + 500]).values_list('termino', 'id')
+                )
+
+            AparicionTermino.objects.bulk_create([
+                AparicionTermino(pasaje=pasaje, termino_id=ids[termino], tf=tf)
+                for pasaje, terminos in zip(pasajes, conteos)
+                for termino, tf in terminos.items()
+            ], batch_size=2000)
+            tocados.update(ids.values())
+
+        _recalcular_df(tocados)
+    cache.delete(ESTADISTICAS_KEY)
+    return len(pasajes)
+
+
+def indexar_documento(documento):
+    """(Re)indexa un DocumentoContexto. Los inactivos o sin texto se quitan del índice."""
+    if not documento.activo or not documento.contenido_texto:
+        desindexar(documento=documento)
+        return 0
+    return _indexar(
+        documento.contenido_texto, documento.nombre,
+        {'documento': documento}, {'curso_id': documento.curso_id},
+    )
+
+
+def indexar_tema(tema):
+    if not tema.contenido_texto:
+        desindexar(tema=tema)
+        return 0
+    return _indexar(tema.contenido_texto, tema.nombre, {'tema': tema}, {'materia': tema.materia or ''})
+
+
+def desindexar(**origen):
+    with transaction.atomic():
+        _recalcular_df(_borrar_pasajes(PasajeIndice.objects.filter(**origen)))
+    cache.delete(ESTADISTICAS_KEY)
+
+
+def indexar_todo(solo_documentos=False):
+    """Rehace el índice entero. Devuelve (documentos indexados, temas indexados)."""
+    documentos = sum(1 for documento in DocumentoContexto.objects.iterator() if indexar_documento(documento))
+    temas = 0
+    if not solo_documentos:
+        temas = sum(1 for tema in Tema.objects.iterator() if indexar_tema(tema))
+    # Pasajes sin documento ni tema (p.ej. filas borradas a mano en la BD), con su df
+    desindexar(documento=None, tema=None)
+    return documentos, temas
+
+
+def indexar_si_vacio(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Receptor de post_migrate: construye el índice si aún no tiene ningún pasaje."""
+    if using != DEFAULT_DB_ALIAS or PasajeIndice.objects.exists():
+        return
+    documentos, temas = indexar_todo()
+    if documentos or temas:
+        logger.info(f"[INDICE TEXTO] Índice construido: {documentos} documentos y {temas} temas")
+
+
+# --- Búsqueda ---
+
+def estadisticas():
+    """(número de pasajes, longitud media), cacheado hasta el siguiente cambio del índice."""
+    datos = cache.get(ESTADISTICAS_KEY)
+    if datos is None:
+        agregado = PasajeIndice.objects.aggregate(total=Count('id'), media=Avg('longitud'))
+        datos = (agregado['total'], agregado['media'] or 1.0)
+        cache.set(ESTADISTICAS_KEY, datos, ESTADISTICAS_TIMEOUT)
+    return datos
+
+
+def _puntuar(apariciones, total, media):
+    puntuaciones = Counter()
+    for pasaje_id, tf, longitud, df in apariciones:
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        puntuaciones[pasaje_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * longitud / media))
+    return puntuaciones
+
+
+def buscar(pregunta, cantidad=4, cursos_ids=None, materia=None):
+    """
+    Los `cantidad` pasajes con mejor BM25 para `pregunta`, de los documentos de
+    esos cursos (cursos_ids) o de los temas de esa materia.
+    """
+    terminos = list(set(tokenizar(pregunta)))
+    if not terminos:
+        return []
+
+    apariciones = AparicionTermino.objects.filter(termino__termino__in=terminos)
+    if cursos_ids is not None:
+        apariciones = apariciones.filter(pasaje__curso_id__in=cursos_ids)
+    if materia is not None:
+        apariciones = apariciones.filter(pasaje__tema__isnull=False, pasaje__materia=materia)
+
+    total, media = estadisticas()
+    puntuaciones = _puntuar(
+        apariciones.values_list('pasaje_id', 'tf', 'pasaje__longitud', 'termino__df'), total, media
+    )
+    mejores = puntuaciones.most_common(cantidad)
+    pasajes = PasajeIndice.objects.select_related('documento', 'tema').in_bulk([p for p, _ in mejores])
+    return [Coincidencia(pasajes[p], puntuacion) for p, puntuacion in mejores if p in pasajes]
@@ -0,0 +1,189 @@
+"""
+Comando de gestión para medir entregas concurrentes sobre SQLite con y sin
+el perfil de producción (SQLITE_OPCIONES_PRODUCCION en settings).
+
+Para cada perfil apunta la conexión 'default' a una base de datos SQLite
+temporal, le aplica las migraciones del proyecto y crea un banco de
+preguntas y unos alumnos de prueba. Después lanza varios hilos que entregan
+tests a la vez con registrar_entrega (las mismas escrituras que una entrega
+real: perfil, resultado, respuestas, puntos débiles, escalafón, cubos y
+estadísticas) mientras otros leen el escalafón. Cada hilo usa su propia
+conexión de Django, así que se aplican exactamente las mismas OPTIONS que en
+producción. Al acabar se restaura la conexión; no toca la base de datos ni
+la caché del proyecto.
+
+Uso:
+    python manage.py benchmark_sqlite
+    python manage.py benchmark_sqlite --hilos 16 --entregas 100 --lectores 4
+"""
+
+import copy
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test.utils import override_settings
+
+from simulador.clasificacion import escalafon_top
+from simulador.models import Curso, Examen, Opcion, Pregunta, Resultado, Tema
+from simulador.motor_examen import calcular_clave, congelar_clave, corregir, registrar_entrega
+
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de entregas concurrentes en SQLite con y sin el perfil de producción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos que entregan tests (default: 8)')
+        parser.add_argument('--entregas', type=int, default=50, help='Entregas por hilo (default: 50)')
+        parser.add_argument('--preguntas', type=int, default=30, help='Preguntas por test (default: 30)')
+        parser.add_argument('--lectores', type=int, default=2, help='Hilos que leen el escalafón (default: 2)')
+
+    def handle(self, *args, **options):
+        perfiles = [
+            ('por defecto', {}),
+            ('producción', settings.SQLITE_OPCIONES_PRODUCCION),
+        ]
+        directorio = Path(tempfile.mkdtemp(prefix='benchmark_sqlite_'))
+        original = copy.deepcopy(connections.settings[DEFAULT_DB_ALIAS])
+        # Caché propia: la del proyecto puede estar compartida con los workers
+        cache_propia = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark_sqlite'},
+        })
+        cache_propia.enable()
+        try:
+            self.stdout.write(
+                f"{options['hilos']} hilos x {options['entregas']} entregas de "
+                f"{options['preguntas']} preguntas, {options['lectores']} lectores\n"
+            )
+            for i, (nombre, opciones) in enumerate(perfiles):
+                self._apuntar_default(original, directorio / f'perfil{i}.sqlite3', opciones)
+                cache.clear()
+                datos = self._medir(options)
+                self.stdout.write(self.style.SUCCESS(f'Perfil {nombre}:'))
+                self.stdout.write(f"  - Entregas correctas: {datos['correctas']}")
+                self.stdout.write(f"  - Errores 'database is locked': {datos['bloqueos']}")
+                self.stdout.write(f"  - Entregas/s: {datos['por_segundo']:.0f}")
+                self.stdout.write(f"  - Latencia p50 / p95: {datos['p50']:.1f} ms / {datos['p95']:.1f} ms")
+                self.stdout.write(f"  - Lecturas del escalafón: {datos['lecturas']}")
+        finally:
+            self._apuntar_default(original)
+            cache_propia.disable()
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    def _apuntar_default(self, original, ruta=None, opciones=None):
+        """
+        Cambia los ajustes de la conexión 'default' en el sitio (los comparten
+        las conexiones de todos los hilos) y la cierra para que la siguiente
+        consulta abra una nueva. Sin `ruta`, vuelve a los ajustes originales.
+        """
+        ajustes = connections.settings[DEFAULT_DB_ALIAS]
+        ajustes.clear()
+        ajustes.update(copy.deepcopy(original))
+        if ruta is not None:
+            ajustes.update({
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': str(ruta),
+                'OPTIONS': dict(opciones),
+            })
+        connections[DEFAULT_DB_ALIAS].close()
+        del connections[DEFAULT_DB_ALIAS]
+
+    def _preparar(self, options):
+        """Migra la base de datos temporal y crea el banco de preguntas, los alumnos y sus exámenes."""
+        call_command('migrate', verbosity=0, interactive=False)
+
+        curso = Curso.objects.create(nombre='Benchmark')
+        tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Benchmark')
+        preguntas = Pregunta.objects.bulk_create([
+            Pregunta(tema=tema, enunciado=f'Pregunta {n}') for n in range(options['preguntas'])
+        ])
+        Opcion.objects.bulk_create([
+            Opcion(pregunta=pregunta, texto=f'Opción {k}', es_correcta=(k == 0))
+            for pregunta in preguntas for k in range(3)
+        ])
+        preguntas_ids = [pregunta.id for pregunta in preguntas]
+        clave = calcular_clave(preguntas_ids)
+        congelada = congelar_clave(preguntas_ids)
+
+        # Notas variadas: en la entrega n se aciertan las n % 11 décimas partes del test
+        correcciones = []
+        for n in range(11):
+            aciertos = len(preguntas_ids) * n // 10
+            respuestas = {f'pregunta_{p}': clave[p] for p in preguntas_ids[:aciertos]}
+            correcciones.append(corregir(preguntas_ids, clave, respuestas))
+
+        alumnos = [User.objects.create_user(f'benchmark{i}') for i in range(options['hilos'])]
+        examenes = {}
+        for alumno in alumnos:
+            examenes[alumno.id] = Examen.objects.bulk_create([
+                Examen(
+                    usuario=alumno, preguntas_ids=Examen.empaquetar_ids(preguntas_ids),
+                    clave_respuestas=congelada, modo='EXAMEN',
+                )
+                for _ in range(options['entregas'])
+            ])
+        connections[DEFAULT_DB_ALIAS].close()
+        return alumnos, examenes, correcciones
+
+    def _medir(self, options):
+        alumnos, examenes, correcciones = self._preparar(options)
+
+        latencias = []
+        contadores = {'correctas': 0, 'bloqueos': 0, 'lecturas': 0}
+        lock = threading.Lock()
+        parar = threading.Event()
+
+        def entregar(alumno):
+            for n, examen in enumerate(examenes[alumno.id]):
+                inicio = time.perf_counter()
+                try:
+                    registrar_entrega(examen, alumno, correcciones[n % len(correcciones)])
+                except OperationalError:
+                    with lock:
+                        contadores['bloqueos'] += 1
+                    continue
+                with lock:
+                    contadores['correctas'] += 1
+                    latencias.append(time.perf_counter() - inicio)
+            connections[DEFAULT_DB_ALIAS].close()
+
+        def leer():
+            while not parar.is_set():
+                try:
+                    escalafon_top()
+                    Resultado.objects.count()
+                except OperationalError:
+                    pass
+                else:
+                    with lock:
+                        contadores['lecturas'] += 1
+            connections[DEFAULT_DB_ALIAS].close()
+
+        escritores = [threading.Thread(target=entregar, args=(alumno,)) for alumno in alumnos]
+        lectores = [threading.Thread(target=leer) for _ in range(options['lectores'])]
+        inicio = time.perf_counter()
+        for hilo in lectores + escritores:
+            hilo.start()
+        for hilo in escritores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        parar.set()
+        for hilo in lectores:
+            hilo.join()
+
+        latencias.sort()
+        return {
+            **contadores,
+            'por_segundo': contadores['correctas'] / duracion,
+            'p50': statistics.median(latencias) * 1000 if latencias else 0.0,
+            'p95': latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0.0,
+        }
@@ -0,0 +1,36 @@
+"""
+Comando de gestión para reconstruir el índice de texto del Instructor IA.
+
+Guardar un DocumentoContexto o un Tema ya actualiza su parte del índice, y
+migrate lo construye si está vacío; este comando lo rehace entero (p.ej. tras
+cambiar la tokenización o tras cambios masivos hechos con .update()).
+
+Uso:
+    python manage.py indexar_contexto
+    python manage.py indexar_contexto --solo-documentos
+"""
+
+from django.core.management.base import BaseCommand
+
+from simulador.indice_texto import estadisticas, indexar_todo
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice BM25 de documentos de contexto y temas para el Instructor IA'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-documentos',
+            action='store_true',
+            help='Reindexa solo los documentos de contexto, no el texto de los temas',
+        )
+
+    def handle(self, *args, **options):
+        documentos, temas = indexar_todo(solo_documentos=options['solo_documentos'])
+
+        total, media = estadisticas()
+        self.stdout.write(self.style.SUCCESS(f'Indexación completada:'))
+        self.stdout.write(f'  - Documentos indexados: {documentos}')
+        if not options['solo_documentos']:
+            self.stdout.write(f'  - Temas indexados: {temas}')
+        self.stdout.write(f'  - Pasajes en el índice: {total} (media {media:.0f} términos)')
@@ -0,0 +1,54 @@
+"""
+Comando de gestión para borrar exámenes abandonados (empezados y nunca entregados).
+
+Sustituye a las purgas de "zombies" que antes se hacían en cada petición.
+Pensado para cron, p.ej. cada hora:
+
+Uso:
+    python manage.py limpiar_examenes_abandonados
+    python manage.py limpiar_examenes_abandonados --horas 48 --lote 1000
+    python manage.py limpiar_examenes_abandonados --dry-run  # Solo cuenta
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from simulador.mantenimiento import edad_abandono, purgar_examenes_abandonados
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes los exámenes no entregados más antiguos que una edad dada'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas',
+            type=int,
+            help='Edad mínima en horas para considerar abandonado un examen (default: SIMULADOR_EXAMEN_ABANDONADO_HORAS)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Exámenes borrados por sentencia (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántos exámenes se eliminarían sin eliminarlos',
+        )
+
+    def handle(self, *args, **options):
+        edad = timedelta(hours=options['horas']) if options['horas'] is not None else edad_abandono()
+        horas = int(edad.total_seconds() // 3600)
+
+        total = purgar_examenes_abandonados(edad=edad, lote=options['lote'], dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Resumen (modo dry-run):'))
+            self.stdout.write(f'  - Exámenes abandonados de más de {horas}h: {total}')
+            self.stdout.write('')
+            self.stdout.write('Ejecuta sin --dry-run para eliminarlos realmente.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Limpieza completada:'))
+            self.stdout.write(f'  - Exámenes abandonados eliminados (más de {horas}h): {total}')
@@ -0,0 +1,21 @@
+"""
+Comando de gestión para borrar los cubos caducados del escalafón semanal y mensual.
+
+Pensado para cron, p.ej. una vez al día:
+
+Uso:
+    python manage.py purgar_escalafon_periodos
+"""
+
+from django.core.management.base import BaseCommand
+
+from simulador.clasificacion import purgar_periodos
+
+
+class Command(BaseCommand):
+    help = 'Elimina los cubos del escalafón por periodos más antiguos de lo que se conserva'
+
+    def handle(self, *args, **options):
+        borradas = purgar_periodos()
+        self.stdout.write(self.style.SUCCESS(f'Limpieza completada:'))
+        self.stdout.write(f'  - Filas de escalafón por periodos eliminadas: {borradas}')
@@ -0,0 +1,91 @@
+"""
+Comando de gestión para recalibrar Pregunta.dificultad con la tasa de fallo observada.
+
+Cada entrega suma a Pregunta.veces_respondida / veces_fallada; este comando
+reasigna la dificultad (1: Fácil, 2: Medio, 3: Difícil) de las preguntas con
+suficientes respuestas. Pensado para cron, p.ej. una vez por semana.
+
+Uso:
+    python manage.py recalibrar_dificultad
+    python manage.py recalibrar_dificultad --min-respuestas 50
+    python manage.py recalibrar_dificultad --dry-run  # Solo muestra los cambios
+"""
+
+from django.core.management.base import BaseCommand
+
+from simulador.models import Pregunta
+from simulador.muestreo import invalidar_indice
+
+# Tasa de fallo máxima de cada nivel; por encima del último, Difícil
+UMBRALES = [(0.3, 1), (0.6, 2)]
+
+
+def dificultad_observada(tasa_fallo):
+    for limite, dificultad in UMBRALES:
+        if tasa_fallo < limite:
+            return dificultad
+    return 3
+
+
+class Command(BaseCommand):
+    help = 'Reasigna la dificultad de las preguntas según su tasa de fallo observada'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-respuestas',
+            type=int,
+            default=30,
+            help='Respuestas mínimas para recalibrar una pregunta (default: 30)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Preguntas actualizadas por sentencia (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra cuántas preguntas cambiarían sin modificarlas',
+        )
+
+    def handle(self, *args, **options):
+        candidatas = (
+            Pregunta.objects
+            .filter(veces_respondida__gte=options['min_respuestas'])
+            .only('id', 'dificultad', 'veces_respondida', 'veces_fallada')
+            .order_by('id')
+        )
+
+        cambios = {1: 0, 2: 0, 3: 0}
+        lote = []
+        revisadas = 0
+        for pregunta in candidatas.iterator(chunk_size=options['lote']):
+            revisadas += 1
+            nueva = dificultad_observada(pregunta.tasa_fallo_observada)
+            if nueva == pregunta.dificultad:
+                continue
+            cambios[nueva] += 1
+            pregunta.dificultad = nueva
+            lote.append(pregunta)
+            if len(lote) >= options['lote'] and not options['dry_run']:
+                Pregunta.objects.bulk_update(lote, ['dificultad'])
+                lote = []
+
+        if lote and not options['dry_run']:
+            Pregunta.objects.bulk_update(lote, ['dificultad'])
+
+        total = sum(cambios.values())
+        if total and not options['dry_run']:
+            # bulk_update no lanza señales: se invalida el índice del muestreador a mano
+            invalidar_indice()
+
+        titulo = 'Resumen (modo dry-run):' if options['dry_run'] else 'Recalibración completada:'
+        self.stdout.write(self.style.SUCCESS(titulo))
+        self.stdout.write(f'  - Preguntas con al menos {options["min_respuestas"]} respuestas: {revisadas}')
+        self.stdout.write(f'  - Pasan a Fácil: {cambios[1]}')
+        self.stdout.write(f'  - Pasan a Medio: {cambios[2]}')
+        self.stdout.write(f'  - Pasan a Difícil: {cambios[3]}')
+        if options['dry_run']:
+            self.stdout.write('')
+            self.stdout.write('Ejecuta sin --dry-run para aplicar los cambios.')
@@ -0,0 +1,23 @@
+"""
+Comando de gestión para recalcular el contador de preguntas de cada tema (Tema.num_preguntas).
+
+Las altas, bajas y cambios de tema de preguntas ya lo mantienen al día; este
+comando corrige el contador si se ha tocado la tabla de preguntas sin pasar
+por el ORM o con operaciones masivas (.update(), bulk_create...).
+
+Uso:
+    python manage.py recontar_preguntas
+"""
+
+from django.core.management.base import BaseCommand
+
+from simulador.catalogo import recontar_preguntas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Tema.num_preguntas a partir de las preguntas existentes'
+
+    def handle(self, *args, **options):
+        corregidos = recontar_preguntas()
+        self.stdout.write(self.style.SUCCESS(f'Recuento completado:'))
+        self.stdout.write(f'  - Temas corregidos: {corregidos}')
@@ -0,0 +1,51 @@
+"""
+Comando de gestión para rellenar los resúmenes diarios de actividad (ResumenDiario).
+
+Solo procesa los días completos que aún no están resumidos, así que se puede
+lanzar tantas veces como se quiera. Pensado para cron, p.ej. cada noche:
+
+Uso:
+    python manage.py resumir_actividad_diaria
+    python manage.py resumir_actividad_diaria --desde 2026-01-01  # Recalcula desde esa fecha
+    python manage.py resumir_actividad_diaria --dry-run           # Solo muestra los días pendientes
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from simulador.resumenes import dias_pendientes, resumir_dia
+
+
+class Command(BaseCommand):
+    help = 'Resume por día (por alumno y global) los resultados de los días aún no procesados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            help='Recalcula desde esta fecha (AAAA-MM-DD) aunque ya esté resumida',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra los días que se resumirían sin escribir nada',
+        )
+
+    def handle(self, *args, **options):
+        dias = dias_pendientes(desde=options['desde'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Resumen (modo dry-run):'))
+            self.stdout.write(f'  - Días pendientes: {len(dias)}')
+            if dias:
+                self.stdout.write(f'  - Desde {dias[0]} hasta {dias[-1]}')
+            return
+
+        alumnos = 0
+        for fecha in dias:
+            alumnos += resumir_dia(fecha)
+
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes completados:'))
+        self.stdout.write(f'  - Días procesados: {len(dias)}')
+        self.stdout.write(f'  - Filas de alumno escritas: {alumnos}')
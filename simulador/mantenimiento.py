@@ -0,0 +1,104 @@
+"""
+Tareas de mantenimiento que no deben correr en el camino de una petición.
+
+- purgar_examenes_abandonados(): borra por lotes los exámenes a medias más
+  antiguos que una edad dada. Lo usa el comando limpiar_examenes_abandonados.
+- purgar_periodos() (clasificacion.py): borra los cubos de escalafón semanal
+  y mensual caducados. Lo usa el comando purgar_escalafon_periodos.
+- resumir_pendientes() (resumenes.py): resume los días completos que aún no
+  tienen ResumenDiario. Lo usa el comando resumir_actividad_diaria.
+- Barrendero: hilo opcional que ejecuta las tareas periódicamente dentro del
+  propio proceso (se activa con SIMULADOR_BARRENDERO_INTERVALO > 0). Lo
+  arrancan wsgi.py y asgi.py, no los comandos de gestión ni los tests.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .clasificacion import purgar_periodos
+from .models import Examen
+from .motor_examen import olvidar_examen
+from .resumenes import resumir_pendientes
+
+logger = logging.getLogger(__name__)
+
+
+def edad_abandono():
+    return timedelta(hours=getattr(settings, 'SIMULADOR_EXAMEN_ABANDONADO_HORAS', 24))
+
+
+def examenes_abandonados(edad=None):
+    limite = timezone.now() - (edad if edad is not None else edad_abandono())
+    return Examen.objects.filter(completado=False, fecha__lt=limite)
+
+
+def purgar_examenes_abandonados(edad=None, lote=500, dry_run=False):
+    """
+    Borra los exámenes no entregados más antiguos que `edad`, de `lote` en
+    `lote` para no bloquear SQLite con un DELETE enorme. Devuelve cuántos borró
+    (o cuántos borraría con dry_run).
+    """
+    abandonados = examenes_abandonados(edad)
+    if dry_run:
+        return abandonados.count()
+
+    borrados = 0
+    while True:
+        ids = list(abandonados.order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            break
+        Examen.objects.filter(id__in=ids).delete()
+        for examen_id in ids:
+            olvidar_examen(examen_id)
+        borrados += len(ids)
+
+    if borrados:
+        logger.info(f"[BARRENDERO] {borrados} exámenes abandonados eliminados")
+    return borrados
+
+
+class Barrendero(threading.Thread):
+    """Hilo demonio que lanza las tareas de mantenimiento cada `intervalo` segundos."""
+
+    def __init__(self, intervalo):
+        super().__init__(name='simulador-barrendero', daemon=True)
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+
+    def ejecutar_tareas(self):
+        purgar_examenes_abandonados()
+        borradas = purgar_periodos()
+        if borradas:
+            logger.info(f"[BARRENDERO] {borradas} filas de escalafón por periodos caducadas eliminadas")
+        resumir_pendientes()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.ejecutar_tareas()
+            except Exception as e:
+                logger.error(f"[BARRENDERO] Error en mantenimiento: {e}")
+            finally:
+                close_old_connections()
+
+    def parar(self):
+        self._parar.set()
+
+
+_barrendero = None
+
+
+def iniciar_barrendero():
+    """Arranca el barrendero una sola vez por proceso si está configurado."""
+    global _barrendero
+    intervalo = getattr(settings, 'SIMULADOR_BARRENDERO_INTERVALO', 0)
+    if not intervalo or _barrendero is not None:
+        return None
+    _barrendero = Barrendero(intervalo)
+    _barrendero.start()
+    logger.info(f"[BARRENDERO] Activo cada {intervalo}s")
+    return _barrendero
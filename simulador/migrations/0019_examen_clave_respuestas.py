@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0018_add_documento_contexto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examen',
+            name='clave_respuestas',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
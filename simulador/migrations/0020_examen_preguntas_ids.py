@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+import struct
+
+from django.db import migrations, models
+
+
+def m2m_a_empaquetado(apps, schema_editor):
+    """Copia la M2M al array empaquetado, en orden de inserción de la tabla intermedia."""
+    Examen = apps.get_model('simulador', 'Examen')
+    Intermedia = Examen.preguntas.through
+
+    ultimo_id = 0
+    while True:
+        lote = list(Examen.objects.filter(id__gt=ultimo_id).order_by('id').only('id')[:500])
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+
+        ids_por_examen = {}
+        filas = (
+            Intermedia.objects
+            .filter(examen_id__in=[e.id for e in lote])
+            .order_by('examen_id', 'id')
+            .values_list('examen_id', 'pregunta_id')
+        )
+        for examen_id, pregunta_id in filas:
+            ids_por_examen.setdefault(examen_id, []).append(pregunta_id)
+
+        for examen in lote:
+            ids = ids_por_examen.get(examen.id, [])
+            examen.preguntas_ids = struct.pack(f'<{len(ids)}I', *ids)
+        Examen.objects.bulk_update(lote, ['preguntas_ids'])
+
+
+def empaquetado_a_m2m(apps, schema_editor):
+    Examen = apps.get_model('simulador', 'Examen')
+    Intermedia = Examen.preguntas.through
+
+    filas = []
+    for examen in Examen.objects.only('id', 'preguntas_ids').iterator(chunk_size=2000):
+        datos = bytes(examen.preguntas_ids or b'')
+        for pregunta_id in struct.unpack(f'<{len(datos) // 4}I', datos):
+            filas.append(Intermedia(examen_id=examen.id, pregunta_id=pregunta_id))
+    Intermedia.objects.bulk_create(filas, batch_size=2000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0019_examen_clave_respuestas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examen',
+            name='preguntas_ids',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.RunPython(m2m_a_empaquetado, empaquetado_a_m2m),
+        migrations.RemoveField(
+            model_name='examen',
+            name='preguntas',
+        ),
+        migrations.AlterField(
+            model_name='examen',
+            name='completado',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0020_examen_preguntas_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebilidadPregunta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('fallos', models.PositiveIntegerField(default=0)),
+                ('tasa_fallo', models.FloatField(default=0.0)),
+                ('pregunta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulador.pregunta')),
+                ('tema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulador.tema')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debilidades_pregunta', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'tema', '-tasa_fallo'], name='debilidad_pregunta_repaso')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'pregunta'), name='debilidad_pregunta_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DebilidadTema',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('fallos', models.PositiveIntegerField(default=0)),
+                ('tasa_fallo', models.FloatField(default=0.0)),
+                ('tema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulador.tema')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debilidades_tema', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', '-tasa_fallo'], name='debilidad_tema_ranking')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'tema'), name='debilidad_tema_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RespuestaUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correcta', models.BooleanField(default=False)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('examen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='respuestas', to='simulador.examen')),
+                ('opcion', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='simulador.opcion')),
+                ('pregunta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulador.pregunta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='respuestas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'pregunta'], name='respuesta_usuario_pregunta')],
+            },
+        ),
+    ]
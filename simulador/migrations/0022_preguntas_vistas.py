@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('simulador', '0021_historial_respuestas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreguntasVistas',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preguntas_vistas', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('actual', models.BinaryField(blank=True, default=b'')),
+                ('anterior', models.BinaryField(blank=True, default=b'')),
+                ('elementos', models.PositiveIntegerField(default=0, help_text='Preguntas añadidas a la generación actual')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0022_preguntas_vistas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examen',
+            name='semilla',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0023_examen_semilla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examen',
+            name='modo',
+            field=models.CharField(choices=[('EXAMEN', 'Examen (corrección al entregar)'), ('PRACTICA', 'Práctica (corrección al momento)')], default='EXAMEN', max_length=10),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def generar_alias(username, user_id):
+    # Copia de simulador.models.generar_alias congelada para esta migración
+    primera = username[0].upper() if username else 'A'
+    ultima = username[-1].upper() if username else 'Z'
+    return f"{primera}***{ultima}_{user_id % 100}"
+
+
+def rellenar_escalafon(apps, schema_editor):
+    """Calcula el escalafón de los resultados ya existentes (una sola agregación)."""
+    Resultado = apps.get_model('simulador', 'Resultado')
+    EscalafonAlumno = apps.get_model('simulador', 'EscalafonAlumno')
+    filas = (
+        Resultado.objects
+        .values('usuario_id', 'usuario__username')
+        .annotate(tests=Count('id'), suma=Sum('nota'))
+        .order_by('usuario_id')
+    )
+    EscalafonAlumno.objects.bulk_create([
+        EscalafonAlumno(
+            usuario_id=fila['usuario_id'],
+            alias=generar_alias(fila['usuario__username'], fila['usuario_id']),
+            tests=fila['tests'],
+            suma_notas=fila['suma'] or 0.0,
+            nota_media=(fila['suma'] or 0.0) / fila['tests'],
+        )
+        for fila in filas
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('simulador', '0024_examen_modo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscalafonAlumno',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='escalafon', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('alias', models.CharField(max_length=20)),
+                ('tests', models.PositiveIntegerField(default=0)),
+                ('suma_notas', models.FloatField(default=0.0)),
+                ('nota_media', models.FloatField(db_index=True, default=0.0)),
+            ],
+            options={
+                'verbose_name': 'Escalafón',
+                'verbose_name_plural': 'Escalafón',
+            },
+        ),
+        migrations.RunPython(rellenar_escalafon, migrations.RunPython.noop),
+    ]
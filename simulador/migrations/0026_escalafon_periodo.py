@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0025_escalafon_alumno'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscalafonPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('SEMANA', 'Semanal'), ('MES', 'Mensual')], max_length=6)),
+                ('inicio', models.DateField(help_text='Lunes de la semana o día 1 del mes')),
+                ('alias', models.CharField(max_length=20)),
+                ('tests', models.PositiveIntegerField(default=0)),
+                ('suma_notas', models.FloatField(default=0.0)),
+                ('nota_media', models.FloatField(default=0.0)),
+                ('preguntas', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='escalafon_periodos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Escalafón por periodo',
+                'verbose_name_plural': 'Escalafón por periodos',
+                'indexes': [models.Index(fields=['tipo', 'inicio', '-nota_media'], name='escalafon_periodo_nota'), models.Index(fields=['tipo', 'inicio', '-preguntas'], name='escalafon_periodo_preguntas')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'inicio', 'usuario'), name='escalafon_periodo_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+ULTIMAS_GUARDADAS = 10
+
+
+def rellenar_estadisticas(apps, schema_editor):
+    """
+    Resumen de los resultados ya existentes: totales con una agregación y
+    últimos intentos alumno a alumno. El desglose por materia empieza vacío
+    porque los resultados antiguos no guardan las respuestas.
+    """
+    Resultado = apps.get_model('simulador', 'Resultado')
+    EstadisticasUsuario = apps.get_model('simulador', 'EstadisticasUsuario')
+
+    totales = (
+        Resultado.objects
+        .values('usuario_id')
+        .annotate(intentos=Count('id'), suma=Sum('nota'), mejor=Max('nota'))
+        .order_by('usuario_id')
+    )
+    nuevas = []
+    for fila in totales:
+        ultimos = (
+            Resultado.objects
+            .filter(usuario_id=fila['usuario_id'])
+            .select_related('tema')
+            .order_by('-fecha')[:ULTIMAS_GUARDADAS]
+        )
+        nuevas.append(EstadisticasUsuario(
+            usuario_id=fila['usuario_id'],
+            intentos=fila['intentos'],
+            suma_notas=fila['suma'] or 0.0,
+            nota_media=(fila['suma'] or 0.0) / fila['intentos'],
+            mejor_nota=fila['mejor'] or 0.0,
+            ultimas=[
+                {
+                    'fecha': r.fecha.isoformat(),
+                    'tema': r.tema.nombre if r.tema else '',
+                    'nota': round(r.nota, 2),
+                    'aciertos': r.aciertos,
+                    'fallos': r.fallos,
+                }
+                for r in reversed(list(ultimos))
+            ],
+        ))
+        if len(nuevas) >= 500:
+            EstadisticasUsuario.objects.bulk_create(nuevas)
+            nuevas = []
+    EstadisticasUsuario.objects.bulk_create(nuevas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('simulador', '0026_escalafon_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('suma_notas', models.FloatField(default=0.0)),
+                ('nota_media', models.FloatField(default=0.0)),
+                ('mejor_nota', models.FloatField(default=0.0)),
+                ('por_materia', models.JSONField(blank=True, default=dict)),
+                ('ultimas', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de alumno',
+                'verbose_name_plural': 'Estadísticas de alumnos',
+            },
+        ),
+        migrations.RunPython(rellenar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0027_estadisticas_usuario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pregunta',
+            name='veces_fallada',
+            field=models.PositiveIntegerField(default=0, help_text='Fallos y blancos'),
+        ),
+        migrations.AddField(
+            model_name='pregunta',
+            name='veces_respondida',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='debilidadpregunta',
+            index=models.Index(fields=['usuario', '-tasa_fallo'], name='debilidad_pregunta_ranking'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0028_dificultad_observada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tests', models.PositiveIntegerField(default=0)),
+                ('suma_notas', models.FloatField(default=0.0)),
+                ('nota_media', models.FloatField(default=0.0)),
+                ('preguntas', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='resumen_diario_usuario')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'usuario'), name='resumen_diario_unico'), models.UniqueConstraint(condition=models.Q(('usuario__isnull', True)), fields=('fecha',), name='resumen_diario_global_unico')],
+            },
+        ),
+    ]
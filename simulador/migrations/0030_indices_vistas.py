@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0029_resumen_diario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examen',
+            index=models.Index(fields=['usuario', 'completado'], name='examen_usuario_completado'),
+        ),
+        migrations.AddIndex(
+            model_name='perfil',
+            index=models.Index(fields=['-preguntas_respondidas', 'id'], name='perfil_preguntas_respondidas'),
+        ),
+        migrations.AddIndex(
+            model_name='resultado',
+            index=models.Index(fields=['usuario', 'fecha'], name='resultado_usuario_fecha'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 15:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_preguntas(apps, schema_editor):
+    """Rellena el contador con las preguntas que ya existen (un único UPDATE)."""
+    Tema = apps.get_model('simulador', 'Tema')
+    Pregunta = apps.get_model('simulador', 'Pregunta')
+    conteo = (
+        Pregunta.objects
+        .filter(tema=OuterRef('pk'))
+        .order_by()
+        .values('tema')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Tema.objects.update(num_preguntas=Coalesce(Subquery(conteo), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0030_indices_vistas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tema',
+            name='num_preguntas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(contar_preguntas, migrations.RunPython.noop),
+    ]
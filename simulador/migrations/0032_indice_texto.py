@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulador', '0031_tema_num_preguntas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoIndice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=64, unique=True)),
+                ('df', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PasajeIndice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('materia', models.CharField(blank=True, max_length=20)),
+                ('orden', models.PositiveIntegerField(default=0)),
+                ('texto', models.TextField()),
+                ('longitud', models.PositiveIntegerField(default=0, help_text='Términos indexados del pasaje')),
+                ('curso', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulador.curso')),
+                ('documento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pasajes', to='simulador.documentocontexto')),
+                ('tema', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pasajes', to='simulador.tema')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AparicionTermino',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tf', models.PositiveIntegerField(default=1)),
+                ('pasaje', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='apariciones', to='simulador.pasajeindice')),
+                ('termino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='apariciones', to='simulador.terminoindice')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('termino', 'pasaje'), name='aparicion_termino_unica')],
+            },
+        ),
+    ]
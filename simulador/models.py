@@ -1,6 +1,10 @@
+import struct
+
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models import Case, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
 # 1. MODELO: CURSO
@@ -39,6 +43,8 @@ class Tema(models.Model):
     archivo_pdf = models.FileField(upload_to='temarios/', blank=True, null=True)
     archivo_audio = models.FileField(upload_to='temas_audio/', blank=True, null=True, help_text="Archivo MP3 generado")
     contenido_texto = models.TextField(blank=True, null=True, help_text="Texto opcional del tema")
+    # Lo mantienen las señales de Pregunta (ver catalogo.py); se corrige con `manage.py recontar_preguntas`
+    num_preguntas = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['materia', 'capitulo', 'bloque', 'numero_tema']
@@ -52,10 +58,17 @@ class Pregunta(models.Model):
     enunciado = models.TextField()
     explicacion = models.TextField(blank=True, null=True, help_text="Se muestra al fallar o corregir")
     dificultad = models.IntegerField(default=1) # 1: Fácil, 2: Medio, 3: Difícil
+    # Estadística global (todas las entregas): base del comando recalibrar_dificultad
+    veces_respondida = models.PositiveIntegerField(default=0)
+    veces_fallada = models.PositiveIntegerField(default=0, help_text="Fallos y blancos")
 
     def __str__(self):
         return f"{self.tema.nombre} - {self.enunciado[:50]}..."
 
+    @property
+    def tasa_fallo_observada(self):
+        return self.veces_fallada / self.veces_respondida if self.veces_respondida else None
+
 # 4. MODELO: OPCIONES DE RESPUESTA
 class Opcion(models.Model):
     pregunta = models.ForeignKey(Pregunta, on_delete=models.CASCADE, related_name='opciones')
@@ -68,15 +81,50 @@ class Opcion(models.Model):
 # 5. MODELO: EXAMEN (Sesión de Test)
 # Este modelo es necesario para agrupar las preguntas de un test específico
 class Examen(models.Model):
+    MODOS = [
+        ('EXAMEN', 'Examen (corrección al entregar)'),
+        ('PRACTICA', 'Práctica (corrección al momento)'),
+    ]
+
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     fecha = models.DateTimeField(auto_now_add=True)
-    completado = models.BooleanField(default=False)
-    # Guardamos qué preguntas se incluyeron en esta sesión
-    preguntas = models.ManyToManyField(Pregunta)
+    completado = models.BooleanField(default=False, db_index=True)
+    # Guardamos qué preguntas se incluyeron en esta sesión y en qué orden:
+    # array empaquetado de enteros sin signo de 32 bits (little-endian), 4 bytes por pregunta.
+    # Sustituye a la antigua tabla M2M simulador_examen_preguntas.
+    preguntas_ids = models.BinaryField(default=b'', blank=True)
+    # Clave congelada al generar el test: {"pregunta_id": opcion_correcta_id}
+    clave_respuestas = models.JSONField(default=dict, blank=True)
+    # Fija el orden de preguntas y opciones (ver barajado.py). 0 = orden original.
+    semilla = models.PositiveBigIntegerField(default=0)
+    modo = models.CharField(max_length=10, choices=MODOS, default='EXAMEN')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'completado'], name='examen_usuario_completado'),
+        ]
 
     def __str__(self):
         return f"Test de {self.usuario.username} ({self.fecha.strftime('%d/%m/%Y %H:%M')})"
 
+    @staticmethod
+    def empaquetar_ids(ids):
+        ids = list(ids)
+        return struct.pack(f'<{len(ids)}I', *ids)
+
+    @staticmethod
+    def desempaquetar_ids(datos):
+        datos = bytes(datos or b'')  # Postgres devuelve memoryview
+        return list(struct.unpack(f'<{len(datos) // 4}I', datos))
+
+    @property
+    def ids_preguntas(self):
+        return self.desempaquetar_ids(self.preguntas_ids)
+
+    @ids_preguntas.setter
+    def ids_preguntas(self, ids):
+        self.preguntas_ids = self.empaquetar_ids(ids)
+
 # 6. MODELO: RESULTADO
 class Resultado(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -91,10 +139,26 @@ class Resultado(models.Model):
     fallos = models.IntegerField(default=0)
     blancos = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Historial del alumno ordenado por fecha (estadísticas, resúmenes)
+            models.Index(fields=['usuario', 'fecha'], name='resultado_usuario_fecha'),
+        ]
+
     def __str__(self):
         return f"{self.usuario.username} - Nota: {self.nota}"
 
 # 7. MODELO: PERFIL Y RANGOS
+# Preguntas respondidas necesarias para cada rango
+REQUISITOS_RANGO = {
+    'Recluta': 0, 'Soldado': 10, 'Cabo': 100, 'Cabo Primero': 250,
+    'Cabo Mayor': 500, 'Sargento': 750, 'Sargento Primero': 1000,
+    'Brigada': 1250, 'Subteniente': 1500, 'Suboficial Mayor': 1750,
+    'Teniente': 2000, 'Capitán': 2250, 'Comandante': 2500,
+    'Teniente Coronel': 2750, 'Coronel': 3000, 'General de Brigada': 3500,
+    'General de División': 4000, 'Teniente General': 4500,
+}
+
 class Perfil(models.Model):
     RANGOS = [
         ('Recluta', 'Recluta'),
@@ -125,22 +189,34 @@ class Perfil(models.Model):
     referido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='referidos')
     descuento_acumulado = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
     es_premium = models.BooleanField(default=False, help_text="Indica si el usuario tiene suscripción premium activa")
+
+    class Meta:
+        indexes = [
+            # Clasificación general (top y COUNT de mi_posicion en clasificacion.py)
+            models.Index(fields=['-preguntas_respondidas', 'id'], name='perfil_preguntas_respondidas'),
+        ]
     
     def __str__(self):
         return f"{self.usuario.username} - {self.rango}"
 
-    def comprobar_ascenso(self):
-        requisitos = {
-            'Recluta': 0, 'Soldado': 10, 'Cabo': 100, 'Cabo Primero': 250,
-            'Cabo Mayor': 500, 'Sargento': 750, 'Sargento Primero': 1000,
-            'Brigada': 1250, 'Subteniente': 1500, 'Suboficial Mayor': 1750,
-            'Teniente': 2000, 'Capitán': 2250, 'Comandante': 2500,
-            'Teniente Coronel': 2750, 'Coronel': 3000, 'General de Brigada': 3500,
-            'General de División': 4000, 'Teniente General': 4500,
-        }
+    @classmethod
+    def expresion_rango(cls, preguntas):
+        """
+        Expresión SQL con el rango que corresponde a `preguntas` (p.ej. un F()).
+        Permite ascender en el mismo UPDATE que incrementa el contador.
+        """
+        return Case(
+            *[
+                When(GreaterThanOrEqual(preguntas, necesarias), then=Value(r))
+                for r, necesarias in reversed(REQUISITOS_RANGO.items())
+            ],
+            default=Value('Recluta'),
+            output_field=models.CharField(),
+        )
 
+    def comprobar_ascenso(self):
         nuevo_rango = self.rango
-        for r, preguntas_necesarias in reversed(requisitos.items()):
+        for r, preguntas_necesarias in reversed(REQUISITOS_RANGO.items()):
             if self.preguntas_respondidas >= preguntas_necesarias:
                 nuevo_rango = r
                 break 
@@ -275,6 +351,215 @@ class DocumentoContexto(models.Model):
         self.save()
         return texto
 
+# 10. MODELO: HISTORIAL DE RESPUESTAS (una fila por pregunta de cada test entregado)
+class RespuestaUsuario(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='respuestas')
+    examen = models.ForeignKey(Examen, on_delete=models.CASCADE, related_name='respuestas')
+    pregunta = models.ForeignKey(Pregunta, on_delete=models.CASCADE, related_name='+')
+    # None = pregunta dejada en blanco. Sin constraint en BD: el id llega del
+    # formulario tal cual y un valor inventado no debe tumbar la entrega.
+    opcion = models.ForeignKey(Opcion, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    correcta = models.BooleanField(default=False)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'pregunta'], name='respuesta_usuario_pregunta'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - P{self.pregunta_id} ({'OK' if self.correcta else 'KO'})"
+
+# 11. MODELO: ÍNDICE DE PUNTOS DÉBILES (precalculado al entregar cada test)
+# Un blanco cuenta como fallo: el alumno no supo contestar.
+class DebilidadPregunta(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='debilidades_pregunta')
+    pregunta = models.ForeignKey(Pregunta, on_delete=models.CASCADE, related_name='+')
+    tema = models.ForeignKey(Tema, on_delete=models.CASCADE, related_name='+')
+    intentos = models.PositiveIntegerField(default=0)
+    fallos = models.PositiveIntegerField(default=0)
+    tasa_fallo = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'pregunta'], name='debilidad_pregunta_unica'),
+        ]
+        indexes = [
+            # Repaso de fallos: peores preguntas del alumno en los temas elegidos
+            models.Index(fields=['usuario', 'tema', '-tasa_fallo'], name='debilidad_pregunta_repaso'),
+            # Puntos débiles en estadísticas: peores preguntas del alumno en cualquier tema
+            models.Index(fields=['usuario', '-tasa_fallo'], name='debilidad_pregunta_ranking'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - P{self.pregunta_id}: {self.fallos}/{self.intentos}"
+
+class DebilidadTema(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='debilidades_tema')
+    tema = models.ForeignKey(Tema, on_delete=models.CASCADE, related_name='+')
+    intentos = models.PositiveIntegerField(default=0)
+    fallos = models.PositiveIntegerField(default=0)
+    tasa_fallo = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'tema'], name='debilidad_tema_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', '-tasa_fallo'], name='debilidad_tema_ranking'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - Tema {self.tema_id}: {self.fallos}/{self.intentos}"
+
+# 12. MODELO: PREGUNTAS VISTAS (filtro de Bloom por alumno, ver preguntas_vistas.py)
+# Dos generaciones de bits de tamaño fijo: ocupa lo mismo con 1.000 que con 100.000 preguntas en el banco.
+class PreguntasVistas(models.Model):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='preguntas_vistas')
+    actual = models.BinaryField(default=b'', blank=True)
+    anterior = models.BinaryField(default=b'', blank=True)
+    elementos = models.PositiveIntegerField(default=0, help_text="Preguntas añadidas a la generación actual")
+
+    def __str__(self):
+        return f"Preguntas vistas de {self.usuario_id}"
+
+# 13. MODELO: ESCALAFÓN (nota media por alumno, materializada en cada entrega)
+def generar_alias(username, user_id):
+    """Genera un alias semi-anónimo"""
+    primera = username[0].upper() if username else 'A'
+    ultima = username[-1].upper() if username else 'Z'
+    numero = (user_id % 100)
+    return f"{primera}***{ultima}_{numero}"
+
+class EscalafonAlumno(models.Model):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='escalafon')
+    alias = models.CharField(max_length=20)
+    tests = models.PositiveIntegerField(default=0)
+    suma_notas = models.FloatField(default=0.0)
+    nota_media = models.FloatField(default=0.0, db_index=True)
+
+    class Meta:
+        verbose_name = 'Escalafón'
+        verbose_name_plural = 'Escalafón'
+
+    def __str__(self):
+        return f"{self.alias} - {self.nota_media:.2f} ({self.tests} tests)"
+
+# 14. MODELO: ESCALAFÓN POR PERIODOS (un cubo por semana y por mes, se purgan los antiguos)
+class EscalafonPeriodo(models.Model):
+    TIPOS = [
+        ('SEMANA', 'Semanal'),
+        ('MES', 'Mensual'),
+    ]
+
+    tipo = models.CharField(max_length=6, choices=TIPOS)
+    inicio = models.DateField(help_text="Lunes de la semana o día 1 del mes")
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='escalafon_periodos')
+    alias = models.CharField(max_length=20)
+    tests = models.PositiveIntegerField(default=0)
+    suma_notas = models.FloatField(default=0.0)
+    nota_media = models.FloatField(default=0.0)
+    preguntas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'inicio', 'usuario'], name='escalafon_periodo_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'inicio', '-nota_media'], name='escalafon_periodo_nota'),
+            models.Index(fields=['tipo', 'inicio', '-preguntas'], name='escalafon_periodo_preguntas'),
+        ]
+        verbose_name = 'Escalafón por periodo'
+        verbose_name_plural = 'Escalafón por periodos'
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.inicio} - {self.alias}: {self.nota_media:.2f}"
+
+# 15. MODELO: ESTADÍSTICAS DEL ALUMNO (resumen precalculado, se actualiza en cada entrega)
+class EstadisticasUsuario(models.Model):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='estadisticas')
+    intentos = models.PositiveIntegerField(default=0)
+    suma_notas = models.FloatField(default=0.0)
+    nota_media = models.FloatField(default=0.0)
+    mejor_nota = models.FloatField(default=0.0)
+    # {"CABO": {"aciertos": 12, "fallos": 3, "blancos": 1}, ...}
+    por_materia = models.JSONField(default=dict, blank=True)
+    # Últimos intentos para el gráfico, del más antiguo al más reciente:
+    # [{"fecha": iso, "tema": nombre, "nota": 7.5, "aciertos": 15, "fallos": 5}, ...]
+    ultimas = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        verbose_name = 'Estadísticas de alumno'
+        verbose_name_plural = 'Estadísticas de alumnos'
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.intentos} intentos, media {self.nota_media:.2f}"
+
+# 16. MODELO: RESUMEN DIARIO DE ACTIVIDAD (lo rellena el comando resumir_actividad_diaria)
+class ResumenDiario(models.Model):
+    fecha = models.DateField()
+    # None = fila global de la academia para ese día
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='resumenes_diarios')
+    tests = models.PositiveIntegerField(default=0)
+    suma_notas = models.FloatField(default=0.0)
+    nota_media = models.FloatField(default=0.0)
+    preguntas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'usuario'], name='resumen_diario_unico'),
+            models.UniqueConstraint(fields=['fecha'], condition=models.Q(usuario__isnull=True), name='resumen_diario_global_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='resumen_diario_usuario'),
+        ]
+        verbose_name = 'Resumen diario'
+        verbose_name_plural = 'Resúmenes diarios'
+
+    def __str__(self):
+        quien = self.usuario.username if self.usuario_id else 'Global'
+        return f"{self.fecha} - {quien}: {self.tests} tests"
+
+# 17. MODELO: ÍNDICE DE TEXTO PARA EL INSTRUCTOR IA (BM25, ver indice_texto.py)
+class PasajeIndice(models.Model):
+    # Procede de un documento de contexto o del texto de un tema
+    documento = models.ForeignKey(DocumentoContexto, on_delete=models.CASCADE, null=True, blank=True, related_name='pasajes')
+    tema = models.ForeignKey(Tema, on_delete=models.CASCADE, null=True, blank=True, related_name='pasajes')
+    # Copias para filtrar sin joins: curso del documento / materia del tema
+    curso = models.ForeignKey(Curso, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    materia = models.CharField(max_length=20, blank=True)
+    orden = models.PositiveIntegerField(default=0)
+    texto = models.TextField()
+    longitud = models.PositiveIntegerField(default=0, help_text="Términos indexados del pasaje")
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        origen = self.documento or self.tema
+        return f"{origen} #{self.orden}"
+
+
+class TerminoIndice(models.Model):
+    termino = models.CharField(max_length=64, unique=True)
+    # Número de pasajes en los que aparece (para el idf)
+    df = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.termino} ({self.df})"
+
+
+class AparicionTermino(models.Model):
+    termino = models.ForeignKey(TerminoIndice, on_delete=models.CASCADE, related_name='apariciones')
+    pasaje = models.ForeignKey(PasajeIndice, on_delete=models.CASCADE, related_name='apariciones')
+    tf = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['termino', 'pasaje'], name='aparicion_termino_unica'),
+        ]
+
 # --- SEÑALES ---
 import uuid
 
@@ -291,4 +576,86 @@ def crear_perfil(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def guardar_perfil(sender, instance, **kwargs):
     if hasattr(instance, 'perfil'):
-        instance.perfil.save()
\ No newline at end of file
+        instance.perfil.save()
+
+@receiver(post_save, sender=Opcion)
+@receiver(post_delete, sender=Opcion)
+def refrescar_clave_examenes(sender, instance, raw=False, created=False, **kwargs):
+    """Si se editan las opciones de una pregunta, se corrige la clave de los exámenes abiertos."""
+    if raw:
+        return
+    # Una opción nueva que no es correcta no cambia ninguna clave (p.ej. al importar preguntas)
+    if created and not instance.es_correcta:
+        return
+    from .motor_examen import actualizar_clave_pregunta
+    actualizar_clave_pregunta(instance.pregunta_id)
+
+@receiver(post_save, sender=Pregunta)
+@receiver(post_delete, sender=Pregunta)
+def invalidar_indice_preguntas(sender, raw=False, **kwargs):
+    """Los workers reconstruyen su índice de ids de preguntas en la siguiente petición."""
+    if raw:
+        return
+    from .muestreo import invalidar_indice
+    invalidar_indice()
+
+@receiver(pre_save, sender=Pregunta)
+def recordar_tema_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Al editar una pregunta se apunta su tema actual por si se mueve a otro."""
+    instance._tema_anterior_id = None
+    if raw or instance._state.adding:
+        return
+    # save(update_fields=[...]) sin el tema (p. ej. los contadores de dificultad) no puede moverla
+    if update_fields is not None and not {'tema', 'tema_id'} & set(update_fields):
+        return
+    instance._tema_anterior_id = (
+        Pregunta.objects.filter(pk=instance.pk).values_list('tema_id', flat=True).first()
+    )
+
+@receiver(post_save, sender=Pregunta)
+def contar_pregunta_guardada(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    from .catalogo import mover_preguntas
+    anterior = getattr(instance, '_tema_anterior_id', None)
+    if created:
+        mover_preguntas(None, instance.tema_id)
+    elif anterior is not None and anterior != instance.tema_id:
+        mover_preguntas(anterior, instance.tema_id)
+
+@receiver(post_delete, sender=Pregunta)
+def contar_pregunta_borrada(sender, instance, **kwargs):
+    from .catalogo import mover_preguntas
+    mover_preguntas(instance.tema_id, None)
+
+@receiver(post_save, sender=Tema)
+@receiver(post_delete, sender=Tema)
+def invalidar_catalogo_temas(sender, raw=False, **kwargs):
+    if raw:
+        return
+    from .catalogo import invalidar_temas
+    invalidar_temas()
+
+@receiver(post_save, sender=DocumentoContexto)
+def indexar_documento_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .indice_texto import indexar_documento
+    indexar_documento(instance)
+
+@receiver(pre_delete, sender=DocumentoContexto)
+def desindexar_documento_borrado(sender, instance, **kwargs):
+    from .indice_texto import desindexar
+    desindexar(documento=instance)
+
+@receiver(post_save, sender=Tema)
+def indexar_tema_guardado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'contenido_texto' not in update_fields):
+        return
+    from .indice_texto import indexar_tema
+    indexar_tema(instance)
+
+@receiver(pre_delete, sender=Tema)
+def desindexar_tema_borrado(sender, instance, **kwargs):
+    from .indice_texto import desindexar
+    desindexar(tema=instance)
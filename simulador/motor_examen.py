@@ -0,0 +1,408 @@
+"""
+Motor de corrección de exámenes.
+
+La corrección se hace por conjuntos: se trae de una sola consulta la opción
+correcta de cada pregunta del examen y las respuestas enviadas se puntúan en
+memoria. El número de consultas es constante, tenga el examen 10 o 100
+preguntas.
+
+La clave de respuestas ({pregunta_id: opcion_correcta_id}) se congela al
+generar el examen y se guarda en la fila del Examen, que la vista ya ha
+cargado: entregar un test no vuelve a leer la tabla de opciones. No se
+cachea aparte porque la caché puede ser local a cada worker y una edición de
+las opciones dejaría a los demás corrigiendo con la clave vieja.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min, Prefetch, Q
+
+from .barajado import ordenar_snapshot
+from .clasificacion import anotar_respuestas, registrar_nota, registrar_periodos
+from .debilidades import registrar_respuestas
+from .estadisticas_alumno import registrar_estadisticas
+from .models import Examen, Opcion, Perfil, Pregunta, RespuestaUsuario, Resultado, Tema
+from .preguntas_vistas import marcar_vistas
+
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60 * 24
+PRACTICA_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+# Resultado de corregir un examen. `detalle` es una lista de tuplas
+# (pregunta_id, opcion_id_marcada | None, es_correcta) en el orden del examen.
+Correccion = namedtuple('Correccion', ['nota', 'aciertos', 'fallos', 'blancos', 'detalle'])
+
+# Snapshot inmutable de un examen para pintar examen.html: tuplas de preguntas
+# con sus opciones ya resueltas. Se puede guardar tal cual en la caché.
+PreguntaSnapshot = namedtuple('PreguntaSnapshot', ['id', 'tema_id', 'materia', 'enunciado', 'opciones'])
+OpcionSnapshot = namedtuple('OpcionSnapshot', ['id', 'texto'])
+
+# Una pregunta en la revisión de un examen entregado (resultado.html)
+Revision = namedtuple('Revision', ['pregunta', 'marcada', 'correcta', 'acertada', 'explicacion'])
+
+
+def calcular_clave(preguntas_ids):
+    """
+    Devuelve {pregunta_id: opcion_correcta_id | None} para las preguntas
+    indicadas que existen, con UNA sola consulta. Las borradas no aparecen.
+    """
+    correctas = (
+        Pregunta.objects
+        .filter(id__in=list(preguntas_ids))
+        # Si hubiera varias marcadas como correctas, nos quedamos con la primera
+        .annotate(correcta=Min('opciones__id', filter=Q(opciones__es_correcta=True)))
+        .values_list('id', 'correcta')
+        .order_by()
+    )
+    return dict(correctas)
+
+
+def _clave_desde_json(clave_json):
+    """El JSONField guarda las claves como texto; en memoria usamos enteros."""
+    return {int(pregunta_id): opcion_id for pregunta_id, opcion_id in clave_json.items()}
+
+
+def congelar_clave(preguntas_ids):
+    """
+    Calcula la clave para un examen nuevo y la devuelve en formato JSON,
+    lista para asignarla a Examen.clave_respuestas antes de crearlo. Todas las
+    preguntas que existen quedan en la clave (None si no tienen opción
+    correcta), así los exámenes que contienen una pregunta se encuentran con
+    has_key; las ya borradas se quedan fuera.
+    """
+    clave = calcular_clave(preguntas_ids)
+    return {str(pregunta_id): clave[pregunta_id] for pregunta_id in preguntas_ids if pregunta_id in clave}
+
+
+def obtener_clave(examen, preguntas_ids):
+    """
+    Clave del examen desde su fila, sin tocar la tabla de opciones. Solo los
+    exámenes antiguos (sin clave congelada, o con preguntas que no están en
+    ella) calculan una vez lo que les falta.
+    """
+    faltan = [pregunta_id for pregunta_id in preguntas_ids if str(pregunta_id) not in examen.clave_respuestas]
+    if faltan:
+        # Las preguntas borradas entran como None para no recalcularlas en cada entrega
+        examen.clave_respuestas.update(dict.fromkeys(map(str, faltan)))
+        examen.clave_respuestas.update(congelar_clave(faltan))
+        examen.save(update_fields=['clave_respuestas'])
+    return _clave_desde_json(examen.clave_respuestas)
+
+
+def actualizar_clave_pregunta(pregunta_id):
+    """
+    Invalidación: cuando un admin cambia las opciones de una pregunta se
+    reescribe su entrada en la clave de los exámenes abiertos que la contienen.
+    Los exámenes ya entregados conservan la clave con la que se corrigieron, y
+    los antiguos sin esa entrada la calculan al corregirse (obtener_clave).
+    """
+    abiertos = list(
+        Examen.objects
+        .filter(completado=False, clave_respuestas__has_key=str(pregunta_id))
+        .only('id', 'clave_respuestas')
+    )
+    if not abiertos:
+        return
+
+    correcta = calcular_clave([pregunta_id]).get(pregunta_id)
+    for examen in abiertos:
+        examen.clave_respuestas[str(pregunta_id)] = correcta
+        examen.save(update_fields=['clave_respuestas'])
+        # Las opciones han cambiado: fuera snapshot y ficha de práctica cacheados
+        olvidar_examen(examen.id)
+
+
+def _snapshot_cache_key(examen_id):
+    return f"simulador:examen:{examen_id}:snapshot"
+
+
+def construir_snapshot(preguntas_ids):
+    """Preguntas + opciones con un único prefetch (2 consultas), en el orden dado."""
+    preguntas = (
+        Pregunta.objects
+        .filter(id__in=list(preguntas_ids))
+        .select_related('tema')
+        .only('id', 'enunciado', 'tema__id', 'tema__materia')
+        .prefetch_related(Prefetch(
+            'opciones',
+            queryset=Opcion.objects.only('id', 'texto', 'pregunta_id').order_by('id'),
+        ))
+    )
+    por_id = {
+        p.id: PreguntaSnapshot(
+            id=p.id,
+            tema_id=p.tema_id,
+            materia=p.tema.materia,
+            enunciado=p.enunciado,
+            opciones=tuple(OpcionSnapshot(o.id, o.texto) for o in p.opciones.all()),
+        )
+        for p in preguntas
+    }
+    return tuple(por_id[pid] for pid in preguntas_ids if pid in por_id)
+
+
+def obtener_snapshot(examen, preguntas_ids):
+    """
+    Snapshot del examen, ya en el orden de su semilla, desde la caché; solo
+    se construye la primera vez (y siempre sale igual si caduca).
+    """
+    snapshot = cache.get(_snapshot_cache_key(examen.id))
+    if snapshot is None:
+        snapshot = ordenar_snapshot(construir_snapshot(preguntas_ids), examen.semilla)
+        cache.set(_snapshot_cache_key(examen.id), snapshot, SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def _practica_cache_key(examen_id):
+    return f"simulador:examen:{examen_id}:practica"
+
+
+def preparar_practica(examen, preguntas_ids):
+    """
+    Deja en la caché todo lo que necesita la corrección al momento del modo
+    práctica: dueño, clave y explicaciones. Se llama al pintar el examen; si
+    ya estaba en la caché no se toca la base de datos.
+    """
+    ficha = cache.get(_practica_cache_key(examen.id))
+    if ficha is not None:
+        return ficha
+
+    explicaciones = dict(
+        Pregunta.objects.filter(id__in=list(preguntas_ids)).values_list('id', 'explicacion')
+    )
+    ficha = {
+        'usuario_id': examen.usuario_id,
+        'clave': obtener_clave(examen, preguntas_ids),
+        'explicaciones': explicaciones,
+    }
+    cache.set(_practica_cache_key(examen.id), ficha, PRACTICA_CACHE_TIMEOUT)
+    return ficha
+
+
+def _marcada_cache_key(examen_id, pregunta_id):
+    return f"simulador:examen:{examen_id}:marcada:{pregunta_id}"
+
+
+def corregir_pregunta(examen_id, usuario_id, pregunta_id, opcion_id):
+    """
+    Corrige una sola respuesta de un examen en modo práctica, desde la caché
+    y sin escribir en la base de datos. La primera opción comprobada de cada
+    pregunta se apunta en la caché y es la que cuenta: las siguientes reciben
+    la corrección de esa, y la entrega se puntúa con ellas (respuestas_practica).
+    Devuelve None si el examen no es del alumno, no es de práctica o no
+    contiene la pregunta.
+    """
+    ficha = cache.get(_practica_cache_key(examen_id))
+    if ficha is None:
+        # Caché fría (reinicio, otro worker con caché local...): se reconstruye una vez
+        examen = (
+            Examen.objects
+            .filter(id=examen_id, usuario_id=usuario_id, modo='PRACTICA')
+            .only('id', 'usuario_id', 'preguntas_ids', 'clave_respuestas')
+            .first()
+        )
+        if examen is None:
+            return None
+        ficha = preparar_practica(examen, examen.ids_preguntas)
+
+    if ficha['usuario_id'] != usuario_id or pregunta_id not in ficha['explicaciones']:
+        return None
+
+    # cache.add no pisa una respuesta anterior: vista la correcta, ya no se puede cambiar
+    marcada_key = _marcada_cache_key(examen_id, pregunta_id)
+    if not cache.add(marcada_key, opcion_id, PRACTICA_CACHE_TIMEOUT):
+        opcion_id = cache.get(marcada_key, opcion_id)
+
+    correcta = ficha['clave'].get(pregunta_id)
+    return {
+        'correcta': opcion_id is not None and opcion_id == correcta,
+        'opcion_marcada': opcion_id,
+        'opcion_correcta': correcta,
+        'explicacion': ficha['explicaciones'][pregunta_id] or '',
+    }
+
+
+def respuestas_practica(examen_id, preguntas_ids):
+    """
+    Respuestas de un examen de práctica tal como se comprobaron, en el formato
+    de request.POST ("pregunta_<id>"). Lo que no se comprobó cuenta como blanco.
+    """
+    claves = {_marcada_cache_key(examen_id, pregunta_id): pregunta_id for pregunta_id in preguntas_ids}
+    return {
+        f"pregunta_{claves[clave]}": opcion_id
+        for clave, opcion_id in cache.get_many(list(claves)).items()
+    }
+
+
+def olvidar_practica(examen_id, preguntas_ids):
+    """Tras la entrega ya no hacen falta las respuestas apuntadas."""
+    cache.delete_many([_marcada_cache_key(examen_id, pregunta_id) for pregunta_id in preguntas_ids])
+
+
+def temas_de_preguntas(examen, preguntas_ids):
+    """
+    {pregunta_id: (tema_id, materia)} del examen: del snapshot cacheado o con
+    una sola consulta de ids.
+    """
+    snapshot = cache.get(_snapshot_cache_key(examen.id))
+    if snapshot is not None:
+        return {p.id: (p.tema_id, p.materia) for p in snapshot}
+    return {
+        pregunta_id: (tema_id, materia)
+        for pregunta_id, tema_id, materia in
+        Pregunta.objects.filter(id__in=list(preguntas_ids)).values_list('id', 'tema_id', 'tema__materia')
+    }
+
+
+def olvidar_examen(examen_id):
+    """Borra de la caché todo lo derivado de un examen (snapshot y práctica)."""
+    cache.delete_many([
+        _snapshot_cache_key(examen_id),
+        _practica_cache_key(examen_id),
+    ])
+
+
+def revision_examen(examen):
+    """
+    Preguntas de un examen entregado, en el mismo orden en que se hizo, con la
+    opción marcada y la correcta según la clave congelada. Devuelve [] para
+    exámenes entregados antes de existir el historial de respuestas.
+    """
+    marcadas = {
+        pregunta_id: (opcion_id, correcta)
+        for pregunta_id, opcion_id, correcta in
+        RespuestaUsuario.objects.filter(examen=examen).values_list('pregunta_id', 'opcion_id', 'correcta')
+    }
+    if not marcadas:
+        return []
+
+    preguntas_ids = examen.ids_preguntas
+    clave = _clave_desde_json(examen.clave_respuestas)
+    explicaciones = dict(Pregunta.objects.filter(id__in=preguntas_ids).values_list('id', 'explicacion'))
+    revision = []
+    for pregunta in obtener_snapshot(examen, preguntas_ids):
+        marcada, acertada = marcadas.get(pregunta.id, (None, False))
+        revision.append(Revision(pregunta, marcada, clave.get(pregunta.id), acertada, explicaciones.get(pregunta.id)))
+    return revision
+
+
+def _leer_opcion(valor):
+    """Convierte el valor enviado en el formulario a id de opción (o None)."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def corregir(preguntas_ids, clave, respuestas):
+    """
+    Puntúa las respuestas contra la clave sin tocar la base de datos.
+
+    - `respuestas` es cualquier mapping tipo request.POST con claves
+      "pregunta_<id>".
+    - Una pregunta sin respuesta (o con un valor no numérico) cuenta como blanco.
+    - La nota se calcula sobre 10 con el total de preguntas del examen.
+    """
+    aciertos = fallos = blancos = 0
+    detalle = []
+
+    for pregunta_id in preguntas_ids:
+        opcion_id = _leer_opcion(respuestas.get(f"pregunta_{pregunta_id}"))
+        if opcion_id is None:
+            blancos += 1
+            detalle.append((pregunta_id, None, False))
+            continue
+
+        es_correcta = clave.get(pregunta_id) == opcion_id
+        if es_correcta:
+            aciertos += 1
+        else:
+            fallos += 1
+        detalle.append((pregunta_id, opcion_id, es_correcta))
+
+    total = len(detalle)
+    nota = (aciertos / total * 10) if total > 0 else 0
+    return Correccion(nota, aciertos, fallos, blancos, detalle)
+
+
+def corregir_examen(examen, respuestas, preguntas_ids=None):
+    """Corrige un Examen completo sin leer la tabla de opciones."""
+    if preguntas_ids is None:
+        preguntas_ids = examen.ids_preguntas
+    clave = obtener_clave(examen, preguntas_ids)
+    return corregir(preguntas_ids, clave, respuestas)
+
+
+def _nombre_tema(resultado, temas):
+    """Nombre del tema de un test de un solo tema; si no, 'Varios temas'."""
+    if resultado.tema_id is None:
+        return 'Varios temas' if temas else ''
+    return Tema.objects.filter(id=resultado.tema_id).values_list('nombre', flat=True).first() or ''
+
+
+def registrar_entrega(examen, usuario, correccion):
+    """
+    Cierra el examen y apunta el resultado en una única transacción con un
+    número fijo de escrituras:
+
+    1. UPDATE del examen condicionado a completado=False: si otra pestaña ya
+       lo entregó no se actualiza ninguna fila y no se cuenta dos veces.
+    2. UPDATE del perfil con F(): incremento y rango calculados por la BD,
+       sin leer-modificar-escribir en Python.
+    3. INSERT del Resultado (con su tema si el test es de un solo tema).
+    4. Historial de respuestas, índice de puntos débiles y dificultad
+       observada de las preguntas, por lotes (ver debilidades.registrar_respuestas).
+    5. Filtro de preguntas vistas del alumno (ver preguntas_vistas).
+    6. Fila del escalafón del alumno y cubos de la semana y el mes en curso
+       (ver clasificacion.registrar_nota y registrar_periodos).
+    7. Resumen de estadísticas del alumno (ver estadisticas_alumno).
+
+    Al confirmar la transacción se avisa a la clasificación general.
+
+    Devuelve el Resultado, o None si el examen ya estaba entregado.
+    """
+    total = len(correccion.detalle)
+
+    with transaction.atomic():
+        cerrado = Examen.objects.filter(id=examen.id, completado=False).update(completado=True)
+        if not cerrado:
+            return None
+
+        nuevo_total = F('preguntas_respondidas') + total
+        Perfil.objects.filter(usuario=usuario).update(
+            preguntas_respondidas=nuevo_total,
+            rango=Perfil.expresion_rango(nuevo_total),
+        )
+        # Se relee tras el UPDATE: usuario.perfil puede estar desfasado si hay otra entrega a la vez
+        respondidas = Perfil.objects.filter(usuario=usuario).values_list('preguntas_respondidas', flat=True).get()
+
+        preguntas_ids = [pregunta_id for pregunta_id, _, _ in correccion.detalle]
+        info = temas_de_preguntas(examen, preguntas_ids)
+        temas = {pregunta_id: tema_id for pregunta_id, (tema_id, _) in info.items()}
+        distintos = set(temas.values())
+
+        resultado = Resultado.objects.create(
+            usuario=usuario,
+            examen=examen,
+            # Solo los tests de un único tema quedan vinculados a él
+            tema_id=distintos.pop() if len(distintos) == 1 else None,
+            nota=correccion.nota,
+            aciertos=correccion.aciertos,
+            fallos=correccion.fallos,
+            blancos=correccion.blancos,
+        )
+
+        registrar_respuestas(usuario, examen, correccion, temas)
+        marcar_vistas(usuario, preguntas_ids)
+        registrar_nota(usuario, correccion.nota)
+        registrar_periodos(usuario, correccion.nota, total)
+        registrar_estadisticas(
+            usuario, resultado, correccion,
+            materias={pregunta_id: materia for pregunta_id, (_, materia) in info.items()},
+            tema_nombre=_nombre_tema(resultado, temas),
+        )
+        transaction.on_commit(lambda: anotar_respuestas(respondidas))
+
+    examen.completado = True
+    return resultado
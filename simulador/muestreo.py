@@ -0,0 +1,187 @@
+"""
+Índice en memoria de ids de preguntas y muestreador estratificado.
+
+El índice agrupa los ids de Pregunta por tema y dificultad. Se construye una
+vez por worker (tema a tema, bajo demanda) leyendo solo ids, nunca enunciados
+ni explicaciones. Cualquier escritura en Pregunta sube una versión en la caché
+y los workers descartan su índice en la siguiente consulta. Como esa caché
+puede ser local a cada proceso (comandos de gestión, otros workers), el índice
+además caduca a los INDICE_MAX_EDAD segundos.
+
+El muestreador elige k ids sin copiar el pool: trabaja sobre una vista
+concatenada de las listas del índice, así que generar un test cuesta O(k).
+"""
+import random
+import threading
+import time
+from bisect import bisect_right
+from itertools import accumulate
+
+from django.core.cache import cache
+
+from .models import Pregunta
+
+INDICE_VERSION_KEY = 'simulador:indice_preguntas:version'
+INDICE_MAX_EDAD = 60 * 10  # Segundos
+
+# Candidatos por pregunta pedida cuando hay que evitar preguntas ya vistas
+SOBREMUESTREO = 3
+
+# Reparto de dificultad que se puede pedir desde configurar_test.
+# Pesos por dificultad (1: Fácil, 2: Medio, 3: Difícil); None = sin estratificar.
+MEZCLAS_DIFICULTAD = {
+    'mixta': None,
+    'equilibrada': {1: 1, 2: 1, 3: 1},
+    'facil': {1: 3, 2: 1},
+    'dificil': {2: 1, 3: 3},
+}
+
+
+class _Bolsa:
+    """Vista de solo lectura sobre varias listas, como si fueran una sola."""
+
+    def __init__(self, listas):
+        self.listas = [l for l in listas if l]
+        self.cortes = list(accumulate(len(l) for l in self.listas))
+
+    def __len__(self):
+        return self.cortes[-1] if self.cortes else 0
+
+    def __getitem__(self, i):
+        n = bisect_right(self.cortes, i)
+        inicio = self.cortes[n - 1] if n else 0
+        return self.listas[n][i - inicio]
+
+    def muestra(self, k, rng, evitar=None):
+        k = min(k, len(self))
+        if evitar is None:
+            return [self[i] for i in rng.sample(range(len(self)), k)]
+
+        # Se sobremuestrea y se prefieren los ids que no cumplen `evitar`;
+        # si no llegan, se completa con los demás. Sigue siendo O(k).
+        candidatos = [self[i] for i in rng.sample(range(len(self)), min(len(self), k * SOBREMUESTREO))]
+        preferidos, resto = [], []
+        for pregunta_id in candidatos:
+            (resto if evitar(pregunta_id) else preferidos).append(pregunta_id)
+        seleccion = (preferidos + resto)[:k]
+        rng.shuffle(seleccion)
+        return seleccion
+
+
+class IndicePreguntas:
+    def __init__(self):
+        self._temas = {}  # tema_id -> {dificultad: (ids...)}
+        self._version = None
+        self._construido_en = None
+        self._lock = threading.Lock()
+
+    def _comprobar_version(self):
+        version = cache.get(INDICE_VERSION_KEY)
+        ahora = time.monotonic()
+        if version != self._version or self._construido_en is None or ahora - self._construido_en >= INDICE_MAX_EDAD:
+            self._temas = {}
+            self._version = version
+            self._construido_en = ahora
+
+    def _cargar(self, temas_ids):
+        faltan = [t for t in temas_ids if t not in self._temas]
+        if not faltan:
+            return
+
+        nuevos = {t: {} for t in faltan}
+        filas = (
+            Pregunta.objects
+            .filter(tema_id__in=faltan)
+            .values_list('tema_id', 'dificultad', 'id')
+            .order_by('id')
+        )
+        for tema_id, dificultad, pregunta_id in filas:
+            nuevos[tema_id].setdefault(dificultad, []).append(pregunta_id)
+
+        for tema_id, por_dificultad in nuevos.items():
+            self._temas[tema_id] = {d: tuple(ids) for d, ids in por_dificultad.items()}
+
+    def estratos(self, temas_ids):
+        """Devuelve {dificultad: [ids_tema_1, ids_tema_2, ...]} para los temas pedidos."""
+        with self._lock:
+            self._comprobar_version()
+            self._cargar(temas_ids)
+            temas = [self._temas[t] for t in temas_ids]
+
+        estratos = {}
+        for por_dificultad in temas:
+            for dificultad, ids in por_dificultad.items():
+                estratos.setdefault(dificultad, []).append(ids)
+        return estratos
+
+
+indice = IndicePreguntas()
+
+
+def invalidar_indice():
+    """Llamar tras cualquier alta, baja o cambio de tema/dificultad de una Pregunta."""
+    try:
+        cache.incr(INDICE_VERSION_KEY)
+    except ValueError:
+        cache.set(INDICE_VERSION_KEY, 1, None)
+
+
+def _repartir(cantidad, pesos, disponibles):
+    """
+    Cuotas por dificultad proporcionales a los pesos (restos mayores), sin
+    pasarse de lo disponible. Lo que falte se completa con el resto de estratos.
+    """
+    total_pesos = sum(pesos.get(d, 0) for d in disponibles)
+    cuotas = {d: 0 for d in disponibles}
+    if total_pesos:
+        exactas = {d: cantidad * pesos.get(d, 0) / total_pesos for d in disponibles}
+        cuotas = {d: min(int(v), disponibles[d]) for d, v in exactas.items()}
+        por_resto = sorted(disponibles, key=lambda d: exactas[d] - int(exactas[d]), reverse=True)
+        for d in por_resto:
+            if sum(cuotas.values()) >= cantidad:
+                break
+            if pesos.get(d) and cuotas[d] < disponibles[d]:
+                cuotas[d] += 1
+
+    # Relleno: si un estrato no llega, se tira de los demás
+    for d in sorted(disponibles, key=lambda d: pesos.get(d, 0), reverse=True):
+        falta = cantidad - sum(cuotas.values())
+        if falta <= 0:
+            break
+        cuotas[d] += min(falta, disponibles[d] - cuotas[d])
+    return cuotas
+
+
+def normalizar_temas(temas_ids):
+    ids = set()
+    for t in temas_ids:
+        try:
+            ids.add(int(t))
+        except (TypeError, ValueError):
+            continue
+    return sorted(ids)
+
+
+def muestrear(temas_ids, cantidad, mezcla=None, rng=random, evitar=None):
+    """
+    Devuelve hasta `cantidad` ids de Pregunta de los temas indicados, sin
+    repetir. `mezcla` es un dict de pesos por dificultad (ver MEZCLAS_DIFICULTAD).
+    `evitar` es un predicado opcional (p.ej. FiltroVistas.contiene): las
+    preguntas que lo cumplen solo se usan si no hay bastantes de las otras.
+    """
+    estratos = indice.estratos(normalizar_temas(temas_ids))
+
+    if not mezcla:
+        bolsa = _Bolsa([ids for listas in estratos.values() for ids in listas])
+        return bolsa.muestra(cantidad, rng, evitar)
+
+    bolsas = {d: _Bolsa(listas) for d, listas in estratos.items()}
+    disponibles = {d: len(b) for d, b in bolsas.items()}
+    cantidad = min(cantidad, sum(disponibles.values()))
+    cuotas = _repartir(cantidad, mezcla, disponibles)
+
+    seleccion = []
+    for dificultad, k in cuotas.items():
+        seleccion.extend(bolsas[dificultad].muestra(k, rng, evitar))
+    rng.shuffle(seleccion)
+    return seleccion
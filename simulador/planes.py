@@ -0,0 +1,34 @@
+"""
+Política central de límites por plan (gratuito / premium).
+
+Todas las vistas deben preguntar aquí qué puede hacer un alumno en lugar de
+repetir constantes sueltas como MAX_PREGUNTAS_FREE.
+"""
+
+
+class LimitesPlan:
+    def __init__(self, nombre, max_preguntas_examen=None):
+        self.nombre = nombre
+        # None = sin límite
+        self.max_preguntas_examen = max_preguntas_examen
+
+    def __repr__(self):
+        return f"<LimitesPlan {self.nombre}>"
+
+    @property
+    def es_limitado(self):
+        return self.max_preguntas_examen is not None
+
+    def ajustar_cantidad(self, cantidad):
+        """Número de preguntas que se le puede generar a un alumno de este plan."""
+        if self.max_preguntas_examen is None:
+            return cantidad
+        return min(cantidad, self.max_preguntas_examen)
+
+
+PLAN_GRATUITO = LimitesPlan('gratuito', max_preguntas_examen=10)
+PLAN_PREMIUM = LimitesPlan('premium')
+
+
+def limites_para(perfil):
+    return PLAN_PREMIUM if perfil.es_premium else PLAN_GRATUITO
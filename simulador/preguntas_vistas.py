@@ -0,0 +1,77 @@
+"""
+Registro compacto de las preguntas que ha visto cada alumno.
+
+Es un filtro de Bloom por alumno: unos pocos KB de bits en una sola fila
+(PreguntasVistas), sin una tabla de historial que cruzar con NOT IN. Para que
+"visto" signifique "visto hace poco" hay dos generaciones: cuando la actual se
+llena pasa a ser la anterior y se empieza una vacía, así que se recuerdan
+entre CAPACIDAD_GENERACION y 2 * CAPACIDAD_GENERACION preguntas recientes.
+
+Un filtro de Bloom puede dar falsos positivos (~2% con estos tamaños) pero
+nunca falsos negativos; para preferir preguntas nuevas es más que suficiente.
+"""
+from .barajado import mezclar64
+from .models import PreguntasVistas
+
+TAMANO_BYTES = 2048                 # Por generación: 4 KB en total por alumno
+NUM_BITS = TAMANO_BYTES * 8
+NUM_HASHES = 4
+CAPACIDAD_GENERACION = 2000         # Preguntas por generación antes de rotar
+
+
+def _posiciones(pregunta_id):
+    # Doble hashing: k posiciones a partir de dos mitades de un único hash de 64 bits
+    h = mezclar64(pregunta_id)
+    h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+    return [(h1 + i * h2) % NUM_BITS for i in range(NUM_HASHES)]
+
+
+def _bits(datos):
+    datos = bytes(datos or b'')  # Postgres devuelve memoryview
+    return bytearray(datos) if len(datos) == TAMANO_BYTES else bytearray(TAMANO_BYTES)
+
+
+def _contiene(bits, posiciones):
+    return all(bits[p >> 3] & (1 << (p & 7)) for p in posiciones)
+
+
+class FiltroVistas:
+    def __init__(self, actual=b'', anterior=b'', elementos=0):
+        self.actual = _bits(actual)
+        self.anterior = _bits(anterior)
+        self.elementos = elementos if len(bytes(actual or b'')) == TAMANO_BYTES else 0
+
+    @classmethod
+    def desde_fila(cls, fila):
+        if fila is None:
+            return cls()
+        return cls(fila.actual, fila.anterior, fila.elementos)
+
+    def contiene(self, pregunta_id):
+        posiciones = _posiciones(pregunta_id)
+        return _contiene(self.actual, posiciones) or _contiene(self.anterior, posiciones)
+
+    def anadir(self, preguntas_ids):
+        for pregunta_id in preguntas_ids:
+            if self.elementos >= CAPACIDAD_GENERACION:
+                self.anterior, self.actual = self.actual, bytearray(TAMANO_BYTES)
+                self.elementos = 0
+            for p in _posiciones(pregunta_id):
+                self.actual[p >> 3] |= 1 << (p & 7)
+            self.elementos += 1
+
+
+def cargar_filtro(usuario):
+    """Filtro del alumno con una lectura por clave primaria (vacío si aún no tiene)."""
+    return FiltroVistas.desde_fila(PreguntasVistas.objects.filter(usuario=usuario).first())
+
+
+def marcar_vistas(usuario, preguntas_ids):
+    """Añade las preguntas de un test entregado al filtro del alumno."""
+    fila, _ = PreguntasVistas.objects.get_or_create(usuario=usuario)
+    filtro = FiltroVistas.desde_fila(fila)
+    filtro.anadir(preguntas_ids)
+    fila.actual = bytes(filtro.actual)
+    fila.anterior = bytes(filtro.anterior)
+    fila.elementos = filtro.elementos
+    fila.save()
@@ -0,0 +1,166 @@
+"""
+Reserva de exámenes pre-generados para las configuraciones más pedidas.
+
+Cada worker lleva la cuenta de qué combinaciones (temas, cantidad, dificultad)
+se piden más y mantiene para ellas una pequeña cola de selecciones de ids ya
+muestreadas. generar_test saca una de la cola (acierto) o muestrea en el
+momento (fallo); en ambos casos un hilo en segundo plano vuelve a llenar la
+cola, así que el inicio del test no espera al muestreador en hora punta.
+
+Está desactivada por defecto (SIMULADOR_RESERVA_TAMANO = 0). Las colas se
+vacían cuando cambia la versión del banco de preguntas en la caché y, como esa
+caché puede ser local a cada worker, también a los INDICE_MAX_EDAD segundos,
+igual que el índice de ids (muestreo.IndicePreguntas).
+
+Los aciertos y fallos se acumulan en la caché (compartida si hay CACHE_URL) y
+se consultan con estado() o en /estado/reservas/ (solo staff).
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .muestreo import INDICE_MAX_EDAD, INDICE_VERSION_KEY, MEZCLAS_DIFICULTAD, muestrear, normalizar_temas
+
+logger = logging.getLogger(__name__)
+
+ACIERTOS_KEY = 'simulador:reservas:aciertos'
+FALLOS_KEY = 'simulador:reservas:fallos'
+
+MAX_CONFIGURACIONES = 10      # Configuraciones populares con reserva
+TECHO_POPULARIDAD = 10000     # Al llegar aquí los contadores se reducen a la mitad
+MAX_VISTAS = 0.2              # Fracción de preguntas ya vistas que se tolera en una selección
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, None)
+
+
+class ReservaExamenes:
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self._colas = {}            # configuración -> deque de tuplas de ids
+        self._popularidad = Counter()
+        self._version = None
+        self._vaciadas_en = None
+        self._lock = threading.Lock()
+        self._pendientes = queue.Queue()
+        self._en_cola = set()
+        self._hilo = None
+
+    @staticmethod
+    def configuracion(temas_ids, cantidad, dificultad):
+        return (tuple(normalizar_temas(temas_ids)), cantidad, dificultad)
+
+    def _comprobar_version(self):
+        # Si cambia el banco de preguntas, las selecciones guardadas ya no valen
+        version = cache.get(INDICE_VERSION_KEY)
+        ahora = time.monotonic()
+        if version != self._version or self._vaciadas_en is None or ahora - self._vaciadas_en >= INDICE_MAX_EDAD:
+            self._colas = {}
+            self._version = version
+            self._vaciadas_en = ahora
+
+    def _es_popular(self, config):
+        return config in dict(self._popularidad.most_common(MAX_CONFIGURACIONES))
+
+    def _anotar_peticion(self, config):
+        self._popularidad[config] += 1
+        if sum(self._popularidad.values()) > TECHO_POPULARIDAD:
+            # Decaimiento: lo que se dejó de pedir acaba saliendo del top
+            self._popularidad = Counter({
+                c: n // 2 for c, n in self._popularidad.items() if n // 2
+            })
+
+    def sacar(self, temas_ids, cantidad, dificultad, evitar=None):
+        """
+        Devuelve una selección de ids pre-generada o None si no hay reserva.
+        Con `evitar` (preguntas ya vistas por el alumno) una selección que
+        repite demasiado se devuelve al final de la cola para otro alumno.
+        """
+        if not self.tamano:
+            return None
+
+        config = self.configuracion(temas_ids, cantidad, dificultad)
+        with self._lock:
+            self._comprobar_version()
+            self._anotar_peticion(config)
+            cola = self._colas.get(config)
+            seleccion = cola.popleft() if cola else None
+            if seleccion and evitar and sum(1 for p in seleccion if evitar(p)) > len(seleccion) * MAX_VISTAS:
+                cola.append(seleccion)
+                seleccion = None
+            popular = self._es_popular(config)
+
+        _incrementar(ACIERTOS_KEY if seleccion else FALLOS_KEY)
+        if popular:
+            self._pedir_relleno(config)
+        return list(seleccion) if seleccion else None
+
+    def _pedir_relleno(self, config):
+        with self._lock:
+            if config in self._en_cola:
+                return
+            self._en_cola.add(config)
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._rellenar_siempre, name='simulador-reservas', daemon=True)
+                self._hilo.start()
+        self._pendientes.put(config)
+
+    def rellenar(self, config):
+        temas, cantidad, dificultad = config
+        with self._lock:
+            self._comprobar_version()
+            cola = self._colas.setdefault(config, deque(maxlen=self.tamano))
+            faltan = self.tamano - len(cola)
+
+        nuevas = []
+        for _ in range(faltan):
+            seleccion = muestrear(temas, cantidad, MEZCLAS_DIFICULTAD.get(dificultad))
+            if not seleccion:
+                break
+            nuevas.append(tuple(seleccion))
+
+        with self._lock:
+            # Si el banco cambió mientras muestreábamos, se descarta lo generado
+            if self._colas.get(config) is cola:
+                cola.extend(nuevas)
+
+    def _rellenar_siempre(self):
+        while True:
+            config = self._pendientes.get()
+            try:
+                self.rellenar(config)
+            except Exception as e:
+                logger.error(f"[RESERVAS] Error rellenando {config}: {e}")
+            finally:
+                with self._lock:
+                    self._en_cola.discard(config)
+                close_old_connections()
+
+    def estado(self):
+        aciertos = cache.get(ACIERTOS_KEY, 0)
+        fallos = cache.get(FALLOS_KEY, 0)
+        total = aciertos + fallos
+        with self._lock:
+            colas = {
+                f"temas={list(t)} cantidad={c} dificultad={d}": len(cola)
+                for (t, c, d), cola in self._colas.items()
+            }
+        return {
+            "aciertos": aciertos,
+            "fallos": fallos,
+            "tasa_aciertos": round(aciertos / total, 3) if total else None,
+            "reservas_worker": colas,
+        }
+
+
+reserva_examenes = ReservaExamenes(getattr(settings, 'SIMULADOR_RESERVA_TAMANO', 0))
@@ -0,0 +1,113 @@
+"""
+Resúmenes diarios de actividad (ResumenDiario), por alumno y globales.
+
+Los gráficos y el admin leen estas filas en lugar de agregar Resultados.
+resumir_pendientes() procesa solo los días completos (hasta ayer) que aún no
+tienen fila global; cada día se resume dentro de su propia transacción
+borrando y reescribiendo sus filas, así que repetir la ejecución no duplica
+nada. Un día sin actividad deja igualmente su fila global a cero para
+marcarlo como procesado.
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from .models import ResumenDiario, Resultado
+
+logger = logging.getLogger(__name__)
+
+
+def _limites_dia(fecha):
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def resumir_dia(fecha):
+    """Recalcula las filas de `fecha` (alumnos + global). Devuelve cuántos alumnos tuvieron actividad."""
+    inicio, fin = _limites_dia(fecha)
+    por_usuario = (
+        Resultado.objects
+        .filter(fecha__gte=inicio, fecha__lt=fin)
+        .values('usuario_id')
+        .annotate(
+            tests=Count('id'),
+            suma=Sum('nota'),
+            preguntas=Sum(F('aciertos') + F('fallos') + F('blancos')),
+        )
+        .order_by('usuario_id')
+    )
+
+    filas = []
+    total_tests = total_preguntas = 0
+    total_suma = 0.0
+    for fila in por_usuario:
+        suma = fila['suma'] or 0.0
+        filas.append(ResumenDiario(
+            fecha=fecha,
+            usuario_id=fila['usuario_id'],
+            tests=fila['tests'],
+            suma_notas=suma,
+            nota_media=suma / fila['tests'],
+            preguntas=fila['preguntas'] or 0,
+        ))
+        total_tests += fila['tests']
+        total_suma += suma
+        total_preguntas += fila['preguntas'] or 0
+
+    filas.append(ResumenDiario(
+        fecha=fecha,
+        usuario=None,
+        tests=total_tests,
+        suma_notas=total_suma,
+        nota_media=total_suma / total_tests if total_tests else 0.0,
+        preguntas=total_preguntas,
+    ))
+
+    with transaction.atomic():
+        ResumenDiario.objects.filter(fecha=fecha).delete()
+        ResumenDiario.objects.bulk_create(filas, batch_size=500)
+    return len(filas) - 1
+
+
+def dias_pendientes(desde=None, hasta=None):
+    """Días completos sin resumir: del siguiente al último resumido (o el primer Resultado) hasta ayer."""
+    hasta = hasta or timezone.localdate() - timedelta(days=1)
+    if desde is None:
+        ultimo = ResumenDiario.objects.filter(usuario__isnull=True).aggregate(ultimo=Max('fecha'))['ultimo']
+        if ultimo is not None:
+            desde = ultimo + timedelta(days=1)
+        else:
+            primero = Resultado.objects.aggregate(primero=Min('fecha'))['primero']
+            if primero is None:
+                return []
+            desde = timezone.localtime(primero).date()
+
+    dias = []
+    while desde <= hasta:
+        dias.append(desde)
+        desde += timedelta(days=1)
+    return dias
+
+
+def resumir_pendientes(desde=None, hasta=None):
+    """Resume todos los días pendientes. Devuelve cuántos días procesó."""
+    dias = dias_pendientes(desde, hasta)
+    for fecha in dias:
+        resumir_dia(fecha)
+    if dias:
+        logger.info(f"[RESUMENES] {len(dias)} días resumidos ({dias[0]} - {dias[-1]})")
+    return len(dias)
+
+
+def actividad_usuario(usuario, dias=30):
+    """Resúmenes diarios del alumno en los últimos `dias` días, del más antiguo al más reciente."""
+    desde = timezone.localdate() - timedelta(days=dias)
+    return list(
+        ResumenDiario.objects
+        .filter(usuario=usuario, fecha__gte=desde)
+        .order_by('fecha')
+        .only('fecha', 'tests', 'nota_media', 'preguntas')
+    )
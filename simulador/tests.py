@@ -1,3 +1,1218 @@
-from django.test import TestCase
+"""
+Presupuesto de consultas de las vistas más usadas.
 
-# Create your tests here.
+Cada test siembra un conjunto de datos parecido al real (varios alumnos con
+tests entregados, varias materias y temas) y comprueba que la vista no pasa
+de un número máximo de consultas. Si un cambio en una plantilla o una vista
+mete un N+1, el test correspondiente falla y enseña las consultas.
+
+Los presupuestos cuentan todo lo que ocurre en la petición (sesión,
+middleware de cursos, etc.). Si una vista necesita legítimamente una
+consulta más, se sube su presupuesto en el mismo cambio.
+"""
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from academia_project import db_routers
+
+from . import barajado, clasificacion, indice_texto, muestreo, preguntas_vistas, reservas, resumenes
+from .debilidades import puntos_debiles, seleccionar_repaso
+from .management.commands.recalibrar_dificultad import dificultad_observada
+from .mantenimiento import purgar_examenes_abandonados
+from .models import (
+    AparicionTermino, Curso, DebilidadPregunta, DebilidadTema, DocumentoContexto, EscalafonAlumno,
+    EscalafonPeriodo, EstadisticasUsuario, Examen, Opcion, PasajeIndice, Perfil, Pregunta, RespuestaUsuario,
+    Resultado, ResumenDiario, Tema, TerminoIndice,
+)
+from .motor_examen import (
+    calcular_clave, congelar_clave, corregir, obtener_clave, obtener_snapshot, registrar_entrega,
+)
+from .reservas import reserva_examenes
+
+PRESUPUESTOS = {
+    'portada': 9,
+    'portada_ventana': 10,
+    'configurar_test': 5,
+    'generar_test': 6,
+    'ver_examen_get': 7,
+    'ver_examen_post': 24,
+    'comprobar_respuesta': 4,
+    'resultado': 7,
+    'escalafon': 7,
+    'estadisticas': 10,
+    'ver_temario': 6,
+    'chat_ia': 2,
+    'chat_ia_post': 8,
+}
+
+MATERIAS = ['CABO', 'INGLÉS', 'GEOGRAFÍA']
+TEMAS_POR_MATERIA = 3
+PREGUNTAS_POR_TEMA = 15
+OTROS_ALUMNOS = 6
+
+
+def aislar_estado(test):
+    """
+    Índice de preguntas nuevo para el test, y reserva de exámenes apagada (su hilo de relleno comparte la base de datos de test).
+    Se parchean los objetos de módulo, así que todo se restaura al acabar.
+    """
+    for objetivo, atributo, valor in [
+        (muestreo, 'indice', muestreo.IndicePreguntas()),
+        (reserva_examenes, 'tamano', 0),
+    ]:
+        parche = mock.patch.object(objetivo, atributo, valor)
+        parche.start()
+        test.addCleanup(parche.stop)
+    cache.clear()
+    test.addCleanup(cache.clear)
+
+
+class PresupuestoConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        cls.temas = []
+        for materia in MATERIAS:
+            for numero in range(1, TEMAS_POR_MATERIA + 1):
+                tema = Tema.objects.create(
+                    curso=cls.curso, materia=materia, numero_tema=numero,
+                    nombre=f'{materia} tema {numero}', contenido_texto='Texto del tema',
+                )
+                cls.temas.append(tema)
+                for n in range(PREGUNTAS_POR_TEMA):
+                    pregunta = Pregunta.objects.create(
+                        tema=tema, enunciado=f'{tema.nombre} pregunta {n}',
+                        dificultad=1 + n % 3, explicacion='Explicación',
+                    )
+                    Opcion.objects.bulk_create([
+                        Opcion(pregunta=pregunta, texto=f'Opción {k}', es_correcta=(k == 0))
+                        for k in range(4)
+                    ])
+
+        cls.alumno = cls._crear_alumno('alumno')
+        cls.otros = [cls._crear_alumno(f'otro{i}') for i in range(OTROS_ALUMNOS)]
+
+    @classmethod
+    def _crear_alumno(cls, username):
+        usuario = User.objects.create_user(username, password='clave-segura')
+        usuario.perfil.cursos_activos.add(cls.curso)
+        # Por la instancia: guardar_perfil vuelve a guardar usuario.perfil en cada login
+        usuario.perfil.es_premium = True
+        usuario.perfil.save(update_fields=['es_premium'])
+        return usuario
+
+    def setUp(self):
+        aislar_estado(self)
+
+        # Historial realista: cada alumno ha entregado un par de tests
+        for usuario in [self.alumno, *self.otros]:
+            self.client.force_login(usuario)
+            for _ in range(2):
+                self._hacer_test()
+        self.client.force_login(self.alumno)
+        cache.clear()
+
+    # --- Utilidades ---
+
+    @contextmanager
+    def presupuesto(self, nombre):
+        maximo = PRESUPUESTOS[nombre]
+        with CaptureQueriesContext(connection) as consultas:
+            yield
+        if len(consultas) > maximo:
+            detalle = '\n'.join(f"  {q['sql']}" for q in consultas.captured_queries)
+            self.fail(f"{nombre}: {len(consultas)} consultas (máximo {maximo})\n{detalle}")
+
+    def _generar(self, cantidad=20, practica=False):
+        datos = {'temas': [t.id for t in self.temas], 'cantidad': cantidad}
+        if not practica:
+            datos['modo_examen'] = 'on'
+        respuesta = self.client.post(reverse('generar_test'), datos)
+        self.assertEqual(respuesta.status_code, 302)
+        return Examen.objects.filter(usuario_id=self.client.session['_auth_user_id']).latest('id')
+
+    def _respuestas(self, examen):
+        correctas = dict(
+            Opcion.objects.filter(pregunta_id__in=examen.ids_preguntas, es_correcta=True)
+            .values_list('pregunta_id', 'id')
+        )
+        # Un tercio bien, un tercio mal y el resto en blanco
+        datos = {}
+        for i, pregunta_id in enumerate(examen.ids_preguntas):
+            if i % 3 == 0:
+                datos[f'pregunta_{pregunta_id}'] = correctas[pregunta_id]
+            elif i % 3 == 1:
+                datos[f'pregunta_{pregunta_id}'] = correctas[pregunta_id] + 1
+        return datos
+
+    def _hacer_test(self):
+        examen = self._generar()
+        url = reverse('ver_examen', args=[examen.id])
+        self.client.get(url)
+        self.client.post(url, self._respuestas(examen))
+        return examen
+
+    # --- Vistas ---
+
+    def test_portada(self):
+        with self.presupuesto('portada'):
+            respuesta = self.client.get(reverse('portada'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_portada_ventana(self):
+        with self.presupuesto('portada_ventana'):
+            respuesta = self.client.get(reverse('portada'), {'ventana': 'semana'})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_configurar_test(self):
+        with self.presupuesto('configurar_test'):
+            respuesta = self.client.get(reverse('configurar_test'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_generar_test(self):
+        with self.presupuesto('generar_test'):
+            respuesta = self.client.post(
+                reverse('generar_test'),
+                {'temas': [t.id for t in self.temas], 'cantidad': 30, 'modo_examen': 'on'},
+            )
+        self.assertEqual(respuesta.status_code, 302)
+
+    def test_ver_examen_get(self):
+        examen = self._generar(cantidad=30)
+        with self.presupuesto('ver_examen_get'):
+            respuesta = self.client.get(reverse('ver_examen', args=[examen.id]))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_ver_examen_post(self):
+        examen = self._generar(cantidad=30)
+        url = reverse('ver_examen', args=[examen.id])
+        self.client.get(url)
+        datos = self._respuestas(examen)
+        with self.presupuesto('ver_examen_post'):
+            respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertTrue(Resultado.objects.filter(examen=examen).exists())
+
+    def test_comprobar_respuesta(self):
+        examen = self._generar(cantidad=10, practica=True)
+        self.client.get(reverse('ver_examen', args=[examen.id]))
+        pregunta_id = examen.ids_preguntas[0]
+        opcion_id = Opcion.objects.filter(pregunta_id=pregunta_id).values_list('id', flat=True).first()
+        with self.presupuesto('comprobar_respuesta'):
+            respuesta = self.client.post(
+                reverse('comprobar_respuesta', args=[examen.id]),
+                {'pregunta': pregunta_id, 'opcion': opcion_id},
+            )
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_resultado(self):
+        resultado = Resultado.objects.filter(usuario=self.alumno).latest('id')
+        with self.presupuesto('resultado'):
+            respuesta = self.client.get(reverse('resultado', args=[resultado.id]))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_escalafon(self):
+        with self.presupuesto('escalafon'):
+            respuesta = self.client.get(reverse('escalafon'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_estadisticas(self):
+        with self.presupuesto('estadisticas'):
+            respuesta = self.client.get(reverse('estadisticas'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_ver_temario(self):
+        with self.presupuesto('ver_temario'):
+            respuesta = self.client.get(reverse('ver_temario'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_chat_ia(self):
+        # Solo la página; la consulta al modelo de lenguaje no se hace en los tests
+        with self.presupuesto('chat_ia'):
+            respuesta = self.client.get(reverse('chat_ia'))
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_chat_ia_post(self):
+        # Sin documentos en el curso: la búsqueda BM25 cae a los temas de CABO
+        tema = next(t for t in self.temas if t.materia == 'CABO')
+        tema.contenido_texto = (
+            'Artículo 14. El servicio de guardia se presta por turnos de veinticuatro horas '
+            'y el relevo se hace siempre con novedades al jefe de guardia.'
+        )
+        tema.save()
+        ollama = mock.Mock(status_code=200)
+        ollama.iter_lines.return_value = [json.dumps({'response': 'Turnos de veinticuatro horas.', 'done': True})]
+
+        with tempfile.TemporaryDirectory() as directorio, override_settings(BASE_DIR=directorio), \
+                mock.patch('simulador.views.requests.post', return_value=ollama) as post:
+            with self.presupuesto('chat_ia_post'):
+                respuesta = self.client.post(
+                    reverse('chat_ia'), json.dumps({'question': '¿Cómo es el relevo de la guardia?'}),
+                    content_type='application/json',
+                )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(post.call_count, 1)
+        self.assertIn('veinticuatro horas', post.call_args.kwargs['json']['prompt'])
+
+
+class CorreccionTests(TestCase):
+    """Generación, puntuación y entrega de un examen (muestreo y motor_examen)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Tema 1')
+        cls.preguntas = []
+        cls.correctas = {}
+        cls.incorrectas = {}
+        for n in range(4):
+            pregunta = Pregunta.objects.create(tema=tema, enunciado=f'Pregunta {n}')
+            opciones = Opcion.objects.bulk_create([
+                Opcion(pregunta=pregunta, texto=f'Opción {k}', es_correcta=(k == 0)) for k in range(3)
+            ])
+            cls.preguntas.append(pregunta.id)
+            cls.correctas[pregunta.id] = opciones[0].id
+            cls.incorrectas[pregunta.id] = opciones[1].id
+        cls.alumno = User.objects.create_user('alumno', password='clave-segura')
+        cls.alumno.perfil.cursos_activos.add(curso)
+
+    def setUp(self):
+        aislar_estado(self)
+        self.clave = calcular_clave(self.preguntas)
+
+    def _corregir(self, valores):
+        respuestas = {f'pregunta_{p}': v for p, v in zip(self.preguntas, valores) if v is not None}
+        return corregir(self.preguntas, self.clave, respuestas)
+
+    def test_clave_de_una_consulta(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(calcular_clave(self.preguntas), self.correctas)
+
+    def test_todo_bien(self):
+        correccion = self._corregir([self.correctas[p] for p in self.preguntas])
+        self.assertEqual((correccion.nota, correccion.aciertos, correccion.fallos, correccion.blancos), (10, 4, 0, 0))
+
+    def test_en_blanco(self):
+        correccion = self._corregir([None] * 4)
+        self.assertEqual((correccion.nota, correccion.aciertos, correccion.fallos, correccion.blancos), (0, 0, 0, 4))
+        self.assertEqual(correccion.detalle[0], (self.preguntas[0], None, False))
+
+    def test_fallo(self):
+        p0, p1 = self.preguntas[:2]
+        correccion = self._corregir([self.correctas[p0], self.incorrectas[p1], None, None])
+        self.assertEqual((correccion.aciertos, correccion.fallos, correccion.blancos), (1, 1, 2))
+        self.assertEqual(correccion.nota, 2.5)
+        self.assertEqual(correccion.detalle[1], (p1, self.incorrectas[p1], False))
+
+    def test_opcion_de_otra_pregunta_es_fallo(self):
+        # La opción correcta de la pregunta 1 enviada como respuesta de la pregunta 0
+        correccion = self._corregir([self.correctas[self.preguntas[1]], None, None, None])
+        self.assertEqual((correccion.aciertos, correccion.fallos, correccion.blancos), (0, 1, 3))
+
+    def test_valor_no_numerico_es_blanco(self):
+        correccion = self._corregir(['abc', '', self.correctas[self.preguntas[2]], None])
+        self.assertEqual((correccion.aciertos, correccion.fallos, correccion.blancos), (1, 0, 3))
+
+    def test_editar_opcion_actualiza_examenes_abiertos(self):
+        p0 = self.preguntas[0]
+        examen = Examen.objects.create(
+            usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas),
+        )
+        antigua = Examen.objects.create(usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas))
+
+        nueva = Opcion.objects.get(id=self.incorrectas[p0])
+        Opcion.objects.filter(id=self.correctas[p0]).update(es_correcta=False)
+        nueva.es_correcta = True
+        nueva.save()
+
+        examen.refresh_from_db()
+        self.assertEqual(examen.clave_respuestas[str(p0)], nueva.id)
+        # La clave vacía de un examen antiguo no se rellena a trozos: se calcula entera al corregir
+        antigua.refresh_from_db()
+        self.assertEqual(antigua.clave_respuestas, {})
+        clave = obtener_clave(antigua, self.preguntas)
+        self.assertEqual(clave, {**self.correctas, p0: nueva.id})
+
+    def test_opcion_nueva_incorrecta_no_consulta_examenes(self):
+        with self.assertNumQueries(1):
+            Opcion.objects.create(pregunta_id=self.preguntas[0], texto='Otra', es_correcta=False)
+
+    def test_examen_sin_preguntas_borradas(self):
+        self.client.force_login(self.alumno)
+        tema_id = Pregunta.objects.get(id=self.preguntas[0]).tema_id
+        muestreo.muestrear([tema_id], 10)  # Índice ya cargado en este worker
+
+        # Borrado desde otro proceso: la versión de la caché local no cambia
+        version = cache.get(muestreo.INDICE_VERSION_KEY)
+        Pregunta.objects.filter(id=self.preguntas[0]).delete()
+        cache.set(muestreo.INDICE_VERSION_KEY, version, None)
+
+        self.client.post(reverse('generar_test'), {'temas': [tema_id], 'cantidad': 10, 'modo_examen': 'on'})
+        examen = Examen.objects.get(usuario=self.alumno)
+        self.assertCountEqual(examen.ids_preguntas, self.preguntas[1:])
+        self.assertCountEqual(examen.clave_respuestas, [str(p) for p in self.preguntas[1:]])
+
+    def test_indice_caduca(self):
+        tema_id = Pregunta.objects.get(id=self.preguntas[0]).tema_id
+        muestreo.muestrear([tema_id], 10)
+        version = cache.get(muestreo.INDICE_VERSION_KEY)
+        Pregunta.objects.filter(id=self.preguntas[0]).delete()
+        cache.set(muestreo.INDICE_VERSION_KEY, version, None)
+
+        self.assertIn(self.preguntas[0], muestreo.muestrear([tema_id], 10))
+        muestreo.indice._construido_en -= muestreo.INDICE_MAX_EDAD
+        self.assertNotIn(self.preguntas[0], muestreo.muestrear([tema_id], 10))
+
+    def test_aviso_demo_solo_si_se_recorta(self):
+        self.client.force_login(self.alumno)  # Plan gratuito: máximo 10 preguntas
+        tema_id = Pregunta.objects.get(id=self.preguntas[0]).tema_id
+
+        self.client.post(reverse('generar_test'), {'temas': [tema_id], 'cantidad': 3})
+        examen = Examen.objects.filter(usuario=self.alumno).latest('id')
+        respuesta = self.client.get(reverse('ver_examen', args=[examen.id]))
+        self.assertNotContains(respuesta, 'Demo gratuita')
+
+        self.client.post(reverse('generar_test'), {'temas': [tema_id], 'cantidad': 30})
+        examen = Examen.objects.filter(usuario=self.alumno).latest('id')
+        respuesta = self.client.get(reverse('ver_examen', args=[examen.id]))
+        self.assertContains(respuesta, 'Tu test se ha limitado a 4 preguntas')
+
+    def test_practica_cuenta_la_primera_respuesta_comprobada(self):
+        self.client.force_login(self.alumno)
+        p0, p1 = self.preguntas[:2]
+        examen = Examen.objects.create(
+            usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas), modo='PRACTICA',
+        )
+        url = reverse('ver_examen', args=[examen.id])
+        comprobar = reverse('comprobar_respuesta', args=[examen.id])
+        self.client.get(url)
+
+        fallo = self.client.post(comprobar, {'pregunta': p0, 'opcion': self.incorrectas[p0]}).json()
+        self.assertEqual(fallo['opcion_correcta'], self.correctas[p0])
+        # Vista la correcta, volver a comprobar no cambia la respuesta apuntada
+        otra = self.client.post(comprobar, {'pregunta': p0, 'opcion': self.correctas[p0]}).json()
+        self.assertEqual((otra['correcta'], otra['opcion_marcada']), (False, self.incorrectas[p0]))
+        self.client.post(comprobar, {'pregunta': p1, 'opcion': self.correctas[p1]})
+
+        # El formulario final no puede reescribir lo comprobado ni añadir respuestas nuevas
+        self.client.post(url, {f'pregunta_{p}': self.correctas[p] for p in self.preguntas})
+        resultado = Resultado.objects.get(examen=examen)
+        self.assertEqual((resultado.aciertos, resultado.fallos, resultado.blancos), (1, 1, 2))
+
+    def test_temas_sin_materia_cuentan_como_cabo(self):
+        self.client.force_login(self.alumno)
+        Tema.objects.update(materia='')
+        examen = Examen.objects.create(
+            usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas), modo='EXAMEN',
+        )
+        p0 = self.preguntas[0]
+        self.client.post(reverse('ver_examen', args=[examen.id]), {f'pregunta_{p0}': self.correctas[p0]})
+        stats = EstadisticasUsuario.objects.get(usuario=self.alumno)
+        self.assertEqual(stats.por_materia, {'CABO': {'aciertos': 1, 'fallos': 0, 'blancos': 3}})
+
+    def test_doble_entrega_cuenta_una_vez(self):
+        self.client.force_login(self.alumno)
+        examen = Examen.objects.create(
+            usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas), modo='EXAMEN',
+        )
+        url = reverse('ver_examen', args=[examen.id])
+        datos = {f'pregunta_{p}': self.correctas[p] for p in self.preguntas}
+
+        primera = self.client.post(url, datos)
+        segunda = self.client.post(url, {})
+
+        resultado = Resultado.objects.get(examen=examen)
+        self.assertRedirects(primera, reverse('resultado', args=[resultado.id]), fetch_redirect_response=False)
+        self.assertRedirects(segunda, reverse('resultado', args=[resultado.id]), fetch_redirect_response=False)
+        self.assertEqual((resultado.nota, resultado.aciertos), (10, 4))
+        self.assertEqual(Perfil.objects.get(usuario=self.alumno).preguntas_respondidas, 4)
+        self.assertEqual(RespuestaUsuario.objects.filter(examen=examen).count(), 4)
+
+
+class ClasificacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Tema 1')
+        cls.preguntas = []
+        for n in range(2):
+            pregunta = Pregunta.objects.create(tema=tema, enunciado=f'Pregunta {n}')
+            Opcion.objects.create(pregunta=pregunta, texto='Correcta', es_correcta=True)
+            cls.preguntas.append(pregunta.id)
+        cls.lider = User.objects.create_user('lider')
+        cls.alumno = User.objects.create_user('alumno')
+        Perfil.objects.filter(usuario=cls.lider).update(preguntas_respondidas=100)
+
+    def setUp(self):
+        aislar_estado(self)
+
+    def _entregar(self, usuario):
+        examen = Examen.objects.create(
+            usuario=usuario, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas), modo='EXAMEN',
+        )
+        correccion = corregir(self.preguntas, calcular_clave(self.preguntas), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_entrega(examen, usuario, correccion)
+
+    def test_empates_comparten_puesto(self):
+        empatado = User.objects.create_user('empatado')
+        Perfil.objects.filter(usuario__in=[self.alumno, empatado]).update(preguntas_respondidas=7)
+
+        posiciones = [
+            clasificacion.mi_posicion(Perfil.objects.get(usuario=u))
+            for u in (self.lider, self.alumno, empatado)
+        ]
+        self.assertEqual(posiciones, [1, 2, 2])
+
+        # El siguiente puesto cuenta a los dos empatados
+        rezagado = Perfil.objects.get(usuario=User.objects.create_user('rezagado'))
+        self.assertEqual(clasificacion.mi_posicion(rezagado), 4)
+
+    def test_total_cuenta_las_altas_al_caducar(self):
+        self.assertEqual(clasificacion.total_alumnos(), 2)
+        User.objects.create_user('nuevo')
+        self.assertEqual(clasificacion.total_alumnos(), 2)
+
+        cache.delete(clasificacion.TOTAL_KEY)
+        self.assertEqual(clasificacion.total_alumnos(), 3)
+
+    def test_entrega_invalida_el_top(self):
+        self.assertEqual([p.preguntas_respondidas for p in clasificacion.top()], [100, 0])
+
+        # usuario.perfil desfasado: la puntuación se relee tras el UPDATE
+        usuario = User.objects.get(id=self.alumno.id)
+        usuario.perfil
+        Perfil.objects.filter(usuario=self.alumno).update(preguntas_respondidas=5)
+        self._entregar(usuario)
+
+        self.assertEqual([p.preguntas_respondidas for p in clasificacion.top()], [100, 7])
+
+    def test_top_lleno_no_se_invalida_si_no_se_entra(self):
+        with mock.patch.object(clasificacion, 'TAMANO_TOP', 1):
+            self.assertEqual([p.username for p in clasificacion.top()], ['lider'])
+            self._entregar(self.alumno)
+            self.assertIsNotNone(cache.get(clasificacion.TOP_KEY))
+
+            Perfil.objects.filter(usuario=self.alumno).update(preguntas_respondidas=99)
+            self._entregar(self.alumno)
+            self.assertIsNone(cache.get(clasificacion.TOP_KEY))
+
+
+class EscalafonTests(TestCase):
+    """Escalafón por nota media y cubos semanales y mensuales (clasificacion.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alumnos = [User.objects.create_user(f'alumno{n}') for n in range(3)]
+
+    def setUp(self):
+        aislar_estado(self)
+
+    def _el_dia(self, fecha):
+        return mock.patch.object(clasificacion.timezone, 'localdate', return_value=fecha)
+
+    def test_nota_media_tras_dos_entregas(self):
+        alumno = self.alumnos[0]
+        clasificacion.registrar_nota(alumno, 6)
+        clasificacion.registrar_nota(alumno, 9)
+
+        fila = EscalafonAlumno.objects.get(usuario=alumno)
+        self.assertEqual((fila.tests, fila.suma_notas, fila.nota_media), (2, 15, 7.5))
+
+    def test_cubos_cambian_al_empezar_el_periodo(self):
+        alumno = self.alumnos[0]
+        # Domingo 31 de mayo: último día de la semana y del mes
+        with self._el_dia(date(2026, 5, 31)):
+            clasificacion.registrar_periodos(alumno, 4, 10)
+            clasificacion.registrar_periodos(alumno, 6, 10)
+        with self._el_dia(date(2026, 6, 1)):
+            clasificacion.registrar_periodos(alumno, 9, 5)
+            semana = clasificacion.top_periodo('SEMANA')
+            mes = clasificacion.top_periodo('MES')
+
+        self.assertEqual(
+            sorted(EscalafonPeriodo.objects.values_list('tipo', 'inicio', 'tests', 'nota_media', 'preguntas')),
+            [
+                ('MES', date(2026, 5, 1), 2, 5.0, 20),
+                ('MES', date(2026, 6, 1), 1, 9.0, 5),
+                ('SEMANA', date(2026, 5, 25), 2, 5.0, 20),
+                ('SEMANA', date(2026, 6, 1), 1, 9.0, 5),
+            ],
+        )
+        # El ranking del lunes solo ve el cubo nuevo
+        self.assertEqual([p.preguntas_respondidas for p in semana], [5])
+        self.assertEqual([p.preguntas_respondidas for p in mes], [5])
+
+    def test_purgar_periodos_solo_borra_los_viejos(self):
+        alumno = self.alumnos[0]
+        hoy = date(2026, 10, 18)
+        for tipo, inicio in [
+            ('SEMANA', hoy - timedelta(weeks=9)),
+            ('SEMANA', hoy - timedelta(weeks=7)),
+            ('MES', hoy - timedelta(days=400)),
+            ('MES', hoy - timedelta(days=300)),
+        ]:
+            EscalafonPeriodo.objects.create(tipo=tipo, inicio=inicio, usuario=alumno, alias='alias')
+
+        with self._el_dia(hoy):
+            self.assertEqual(clasificacion.purgar_periodos(), 2)
+        self.assertEqual(
+            sorted(EscalafonPeriodo.objects.values_list('tipo', 'inicio')),
+            [('MES', hoy - timedelta(days=300)), ('SEMANA', hoy - timedelta(weeks=7))],
+        )
+
+    def test_posicion_por_count(self):
+        primero, empatado, ultimo = self.alumnos
+        for alumno, nota in [(primero, 8), (empatado, 8), (ultimo, 5)]:
+            clasificacion.registrar_nota(alumno, nota)
+            clasificacion.registrar_periodos(alumno, nota, int(nota))
+        sin_tests = User.objects.create_user('sin_tests')
+
+        posiciones = [
+            clasificacion.posicion_escalafon(clasificacion.fila_escalafon(alumno))
+            for alumno in self.alumnos
+        ]
+        self.assertEqual(posiciones, [1, 1, 3])
+        self.assertEqual(clasificacion.total_escalafon(), 3)
+        self.assertEqual(clasificacion.posicion_periodo(ultimo, 'SEMANA'), 3)
+        # Sin fila en el cubo: detrás de todos los que han hecho algún test
+        self.assertEqual(clasificacion.posicion_periodo(sin_tests, 'MES'), 4)
+
+
+class DebilidadesTests(TestCase):
+    """Historial de respuestas e índice de puntos débiles (debilidades.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        cls.temas = [
+            Tema.objects.create(curso=cls.curso, materia='CABO', numero_tema=n, nombre=f'Tema {n}')
+            for n in (1, 2)
+        ]
+        cls.preguntas = []
+        cls.correctas = {}
+        cls.incorrectas = {}
+        for tema in cls.temas:
+            for n in range(2):
+                pregunta = Pregunta.objects.create(tema=tema, enunciado=f'{tema.nombre} pregunta {n}')
+                opciones = Opcion.objects.bulk_create([
+                    Opcion(pregunta=pregunta, texto=f'Opción {k}', es_correcta=(k == 0)) for k in range(2)
+                ])
+                cls.preguntas.append(pregunta.id)
+                cls.correctas[pregunta.id] = opciones[0].id
+                cls.incorrectas[pregunta.id] = opciones[1].id
+        cls.alumno = User.objects.create_user('alumno', password='clave-segura')
+        cls.alumno.perfil.cursos_activos.add(cls.curso)
+        cls.alumno.perfil.es_premium = True
+        cls.alumno.perfil.save(update_fields=['es_premium'])
+
+    def setUp(self):
+        aislar_estado(self)
+
+    def _entregar(self, fallar, en_blanco=()):
+        """Entrega un examen con todas las preguntas: falla las de `fallar`, deja `en_blanco` y acierta el resto."""
+        examen = Examen.objects.create(
+            usuario=self.alumno, preguntas_ids=Examen.empaquetar_ids(self.preguntas),
+            clave_respuestas=congelar_clave(self.preguntas), modo='EXAMEN',
+        )
+        respuestas = {
+            f'pregunta_{p}': self.incorrectas[p] if p in fallar else self.correctas[p]
+            for p in self.preguntas if p not in en_blanco
+        }
+        registrar_entrega(examen, self.alumno, corregir(self.preguntas, calcular_clave(self.preguntas), respuestas))
+        return examen
+
+    def _debilidades(self, modelo, campo):
+        return {
+            obj_id: (intentos, fallos, round(tasa, 2))
+            for obj_id, intentos, fallos, tasa in modelo.objects
+            .filter(usuario=self.alumno).values_list(f'{campo}_id', 'intentos', 'fallos', 'tasa_fallo')
+        }
+
+    def test_registrar_respuestas(self):
+        p0, p1, p2, p3 = self.preguntas
+        t1, t2 = (t.id for t in self.temas)
+        examen = self._entregar(fallar={p0})
+
+        self.assertEqual(
+            dict(RespuestaUsuario.objects.filter(examen=examen).values_list('pregunta_id', 'correcta')),
+            {p0: False, p1: True, p2: True, p3: True},
+        )
+        self.assertEqual(self._debilidades(DebilidadPregunta, 'pregunta'), {
+            p0: (1, 1, 1.0), p1: (1, 0, 0.0), p2: (1, 0, 0.0), p3: (1, 0, 0.0),
+        })
+        self.assertEqual(self._debilidades(DebilidadTema, 'tema'), {t1: (2, 1, 0.5), t2: (2, 0, 0.0)})
+        self.assertEqual(
+            list(Pregunta.objects.filter(id__in=[p0, p1]).order_by('id').values_list('veces_respondida', 'veces_fallada')),
+            [(1, 1), (1, 0)],
+        )
+
+    def test_acumula_entre_entregas(self):
+        p0, p1, p2, p3 = self.preguntas
+        t1, t2 = (t.id for t in self.temas)
+        self._entregar(fallar={p0})
+        self._entregar(fallar={p0, p2})
+
+        self.assertEqual(self._debilidades(DebilidadPregunta, 'pregunta'), {
+            p0: (2, 2, 1.0), p1: (2, 0, 0.0), p2: (2, 1, 0.5), p3: (2, 0, 0.0),
+        })
+        self.assertEqual(self._debilidades(DebilidadTema, 'tema'), {t1: (4, 2, 0.5), t2: (4, 1, 0.25)})
+
+    def test_pregunta_movida_cambia_de_tema(self):
+        p0 = self.preguntas[0]
+        self._entregar(fallar={p0})
+        Pregunta.objects.filter(id=p0).update(tema=self.temas[1])
+        self._entregar(fallar={p0})
+        self.assertEqual(DebilidadPregunta.objects.get(usuario=self.alumno, pregunta_id=p0).tema_id, self.temas[1].id)
+
+    def test_repaso_ordena_por_tasa_de_fallo(self):
+        p0, p1, p2, p3 = self.preguntas
+        self._entregar(fallar={p0, p1, p2})
+        self._entregar(fallar={p1, p2})
+        self._entregar(fallar={p2})
+        todos = [t.id for t in self.temas]
+
+        # p2 3/3, p1 2/3, p0 1/3; p3 sin fallos no entra
+        self.assertEqual(seleccionar_repaso(self.alumno, todos, 10), [p2, p1, p0])
+        self.assertEqual(seleccionar_repaso(self.alumno, todos, 2), [p2, p1])
+        self.assertEqual(seleccionar_repaso(self.alumno, [self.temas[0].id], 10), [p1, p0])
+
+    def test_generar_test_de_repaso(self):
+        p0, p1, p2, p3 = self.preguntas
+        self.client.force_login(self.alumno)
+        datos = {'temas': [t.id for t in self.temas], 'cantidad': 10, 'repaso_fallos': 'on'}
+
+        # Sin fallos registrados se vuelve a configurar el test
+        respuesta = self.client.post(reverse('generar_test'), datos)
+        self.assertRedirects(respuesta, reverse('configurar_test'), fetch_redirect_response=False)
+        self.assertFalse(Examen.objects.exists())
+
+        self._entregar(fallar={p3})
+        self._entregar(fallar={p3, p1})
+        respuesta = self.client.post(reverse('generar_test'), datos)
+        examen = Examen.objects.latest('id')
+        self.assertRedirects(respuesta, reverse('ver_examen', args=[examen.id]), fetch_redirect_response=False)
+        self.assertEqual(examen.ids_preguntas, [p3, p1])
+
+    def test_puntos_debiles(self):
+        p0, p1, p2, p3 = self.preguntas
+        t1, t2 = self.temas
+        self._entregar(fallar={p0})
+        self._entregar(fallar={p0, p2})
+
+        # Con 4 respuestas por tema aún no hay temas débiles, pero sí preguntas
+        temas, preguntas = puntos_debiles(self.alumno)
+        self.assertEqual(temas, [])
+        self.assertEqual([d.pregunta_id for d in preguntas], [p0, p2])
+
+        self._entregar(fallar={p0})
+        temas, preguntas = puntos_debiles(self.alumno)
+        self.assertEqual([(d.tema, d.intentos, d.fallos) for d in temas], [(t1, 6, 3), (t2, 6, 1)])
+        self.assertEqual([(d.pregunta_id, round(d.tasa_fallo, 2)) for d in preguntas], [(p0, 1.0), (p2, 0.33)])
+
+    def test_dificultad_observada_cuenta_blancos_como_fallos(self):
+        p0, p1, p2, p3 = self.preguntas
+        self._entregar(fallar={p0}, en_blanco={p1})
+        self._entregar(fallar=set(), en_blanco={p1})
+
+        observadas = {p.id: p.tasa_fallo_observada for p in Pregunta.objects.filter(id__in=self.preguntas)}
+        self.assertEqual(observadas, {p0: 0.5, p1: 1.0, p2: 0.0, p3: 0.0})
+        self.assertIsNone(Pregunta(veces_respondida=0).tasa_fallo_observada)
+
+    def test_recalibrar_dificultad(self):
+        self.assertEqual(
+            [dificultad_observada(t) for t in (0.0, 0.29, 0.3, 0.59, 0.6, 1.0)], [1, 1, 2, 2, 3, 3],
+        )
+
+        p0, p1, p2, p3 = self.preguntas
+        for pregunta_id, respondida, fallada in [(p0, 10, 1), (p1, 10, 5), (p2, 10, 9), (p3, 5, 5)]:
+            Pregunta.objects.filter(id=pregunta_id).update(
+                dificultad=2, veces_respondida=respondida, veces_fallada=fallada,
+            )
+
+        salida = StringIO()
+        call_command('recalibrar_dificultad', '--min-respuestas', '10', '--dry-run', stdout=salida)
+        self.assertEqual(set(Pregunta.objects.values_list('dificultad', flat=True)), {2})
+
+        call_command('recalibrar_dificultad', '--min-respuestas', '10', '--lote', '1', stdout=salida)
+        self.assertEqual(
+            dict(Pregunta.objects.values_list('id', 'dificultad')), {p0: 1, p1: 2, p2: 3, p3: 2},
+        )
+        self.assertIn('Preguntas con al menos 10 respuestas: 3', salida.getvalue())
+        self.assertIn('Pasan a Fácil: 1', salida.getvalue())
+        self.assertIn('Pasan a Difícil: 1', salida.getvalue())
+
+
+class ReplicaTests(TransactionTestCase):
+    """
+    Router de réplica y ReplicaMiddleware (academia_project/db_routers.py).
+    La réplica es una segunda conexión a la misma base de datos de test, como
+    hace TEST['MIRROR']; TransactionTestCase para que lo escrito se vea desde ella.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # El alias se da de alta aquí y no en la clase: el runner prepara las bases
+        # de datos de `databases` antes, cuando 'replica' no está en settings
+        ajustes = dict(connections['default'].settings_dict)
+        ajustes['TEST'] = {**ajustes['TEST'], 'MIRROR': 'default'}
+        connections.settings[db_routers.ALIAS_REPLICA] = ajustes
+        cls.databases = {'default', db_routers.ALIAS_REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[db_routers.ALIAS_REPLICA].close()
+        del connections[db_routers.ALIAS_REPLICA]
+        del connections.settings[db_routers.ALIAS_REPLICA]
+
+    def setUp(self):
+        aislar_estado(self)
+        # Lo que settings.py activa cuando hay DATABASE_REPLICA_URL
+        parche = mock.patch.object(db_routers, 'hay_replica', return_value=True)
+        parche.start()
+        self.addCleanup(parche.stop)
+        ajustes = override_settings(
+            DATABASE_ROUTERS=['academia_project.db_routers.RouterReplica'],
+            MIDDLEWARE=[*settings.MIDDLEWARE, 'academia_project.db_routers.ReplicaMiddleware'],
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        self.tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Tema 1')
+        for n in range(3):
+            pregunta = Pregunta.objects.create(tema=self.tema, enunciado=f'Pregunta {n}')
+            Opcion.objects.create(pregunta=pregunta, texto='Sí', es_correcta=True)
+        alumno = User.objects.create_user('alumno', password='clave-segura')
+        alumno.perfil.cursos_activos.add(curso)
+        self.client.force_login(alumno)
+
+    def _consultas_replica(self, url):
+        with CaptureQueriesContext(connections[db_routers.ALIAS_REPLICA]) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_solo_lecturas_analiticas_van_a_la_replica(self):
+        self.assertGreater(self._consultas_replica(reverse('escalafon')), 0)
+        self.assertEqual(self._consultas_replica(reverse('configurar_test')), 0)
+
+        router = db_routers.RouterReplica()
+        with db_routers.lecturas_analiticas():
+            self.assertEqual(router.db_for_read(Perfil), db_routers.ALIAS_REPLICA)
+            with transaction.atomic():
+                self.assertIsNone(router.db_for_read(Perfil))
+        self.assertIsNone(router.db_for_read(Perfil))
+
+    def test_tras_escribir_se_lee_de_default(self):
+        respuesta = self.client.post(reverse('generar_test'), {'temas': [self.tema.id], 'cantidad': 3})
+        self.assertIn(db_routers.COOKIE_PAUSA, respuesta.cookies)
+        self.assertEqual(self._consultas_replica(reverse('escalafon')), 0)
+
+        # Dentro de la misma petición, en cuanto se escribe
+        token = db_routers._escrito.set(False)
+        try:
+            with db_routers.lecturas_analiticas():
+                db_routers.marcar_escritura()
+                self.assertIsNone(db_routers.RouterReplica().db_for_read(Perfil))
+        finally:
+            db_routers._escrito.reset(token)
+
+    def test_la_pausa_caduca(self):
+        self.client.cookies[db_routers.COOKIE_PAUSA] = str(time.time() + 60)
+        self.assertEqual(self._consultas_replica(reverse('escalafon')), 0)
+        self.client.cookies[db_routers.COOKIE_PAUSA] = str(time.time() - 1)
+        self.assertGreater(self._consultas_replica(reverse('escalafon')), 0)
+
+
+class IndiceTextoTests(TestCase):
+    """Índice BM25 del Instructor IA (indice_texto)."""
+
+    TEXTO = (
+        "Artículo 1. Los militares tienen derecho a la libertad de expresión en los términos previstos.\n\n"
+        "Artículo 2. El servicio de guardia se presta por turnos de veinticuatro horas con relevo.\n\n"
+        "Artículo 3. La disciplina militar obliga a obedecer órdenes legítimas del superior jerárquico."
+    )
+
+    def setUp(self):
+        aislar_estado(self)
+        self.curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        otro = Curso.objects.create(nombre='Otro curso')
+        self.documento = DocumentoContexto.objects.create(
+            nombre='Reglas de comportamiento', curso=self.curso, contenido_texto=self.TEXTO, activo=True,
+        )
+        DocumentoContexto.objects.create(nombre='Ajeno', curso=otro, contenido_texto=self.TEXTO, activo=True)
+
+    def _df_correcto(self):
+        for termino in TerminoIndice.objects.all():
+            self.assertEqual(termino.df, AparicionTermino.objects.filter(termino=termino).count(), termino.termino)
+
+    def test_un_pasaje_por_articulo(self):
+        pasajes = list(PasajeIndice.objects.filter(documento=self.documento).values_list('texto', flat=True))
+        self.assertEqual(len(pasajes), 3)
+        self.assertTrue(pasajes[1].startswith('Artículo 2.'))
+
+    def test_buscar_ordena_por_bm25_y_filtra_por_curso(self):
+        indice_texto.estadisticas()
+        with self.assertNumQueries(2):
+            coincidencias = indice_texto.buscar('¿Cuántas horas dura la guardia?', cursos_ids=[self.curso.id])
+        self.assertIn('guardia', coincidencias[0].pasaje.texto)
+        self.assertTrue(all(c.pasaje.documento_id == self.documento.id for c in coincidencias))
+        # Sin tildes ni mayúsculas también casa
+        mejor = indice_texto.buscar('DISCIPLINA jerarquica', cursos_ids=[self.curso.id])[0]
+        self.assertIn('disciplina', mejor.pasaje.texto)
+        self.assertEqual(indice_texto.buscar('el de la', cursos_ids=[self.curso.id]), [])
+
+    def test_reindexar_y_borrar_mantienen_df(self):
+        self.documento.contenido_texto = self.TEXTO.replace('guardia', 'vigilancia')
+        self.documento.save()
+        self.assertEqual(TerminoIndice.objects.get(termino='guardia').df, 1)
+        self.assertEqual(TerminoIndice.objects.get(termino='vigilancia').df, 1)
+        self._df_correcto()
+
+        self.documento.activo = False
+        self.documento.save()
+        self.assertFalse(PasajeIndice.objects.filter(documento=self.documento).exists())
+        self._df_correcto()
+
+        DocumentoContexto.objects.all().delete()
+        self.assertFalse(TerminoIndice.objects.exists())
+
+    def test_temas_de_una_materia(self):
+        tema = Tema.objects.create(
+            curso=self.curso, materia='CABO', numero_tema=1, nombre='Disciplina', contenido_texto=self.TEXTO,
+        )
+        coincidencias = indice_texto.buscar('disciplina militar', materia='CABO')
+        self.assertEqual(coincidencias[0].pasaje.tema_id, tema.id)
+        self.assertEqual(indice_texto.buscar('disciplina militar', materia='INGLÉS'), [])
+
+    def test_comando_limpia_huerfanos_y_estadisticas(self):
+        self.assertEqual(indice_texto.estadisticas()[0], 6)
+        PasajeIndice.objects.update(documento=None)  # Huérfanos: no se reindexan desde ningún documento
+        DocumentoContexto.objects.all().delete()
+
+        call_command('indexar_contexto', stdout=StringIO())
+        self.assertFalse(PasajeIndice.objects.exists())
+        self.assertFalse(TerminoIndice.objects.exists())
+        self.assertEqual(indice_texto.estadisticas()[0], 0)
+
+    def test_numeros_de_articulo(self):
+        self.assertEqual(indice_texto.tokenizar('Art. 14 de la Ley 39/2015, artículo 2'), ['art14', 'articulo', 'art2'])
+
+        mejor = indice_texto.buscar('¿Qué dice el artículo 2?', cursos_ids=[self.curso.id])[0]
+        self.assertTrue(mejor.pasaje.texto.startswith('Artículo 2.'))
+
+    def test_migrate_construye_el_indice_vacio(self):
+        indice_texto.desindexar(documento=self.documento)
+        indice_texto.indexar_si_vacio()
+        self.assertEqual(PasajeIndice.objects.filter(documento=self.documento).count(), 0)  # No estaba vacío
+
+        PasajeIndice.objects.all().delete()
+        indice_texto.indexar_si_vacio()
+        self.assertEqual(PasajeIndice.objects.filter(documento=self.documento).count(), 3)
+        self._df_correcto()
+
+
+class PreguntasVistasTests(TestCase):
+    """Filtro de Bloom de preguntas vistas por alumno (preguntas_vistas)."""
+
+    def test_sin_falsos_negativos_y_pocos_falsos_positivos(self):
+        filtro = preguntas_vistas.FiltroVistas()
+        vistas = range(1, preguntas_vistas.CAPACIDAD_GENERACION + 1)
+        filtro.anadir(vistas)
+        self.assertTrue(all(filtro.contiene(p) for p in vistas))
+
+        nuevas = range(100000, 110000)
+        falsos = sum(filtro.contiene(p) for p in nuevas)
+        self.assertLess(falsos / len(nuevas), 0.05)
+
+    def test_dos_generaciones(self):
+        capacidad = preguntas_vistas.CAPACIDAD_GENERACION
+        filtro = preguntas_vistas.FiltroVistas()
+        filtro.anadir([1])
+        filtro.anadir(range(1000, 1000 + capacidad))  # La 1 pasa a la generación anterior
+        self.assertTrue(filtro.contiene(1))
+        filtro.anadir(range(10000, 10000 + capacidad))  # Y después se olvida
+        self.assertFalse(filtro.contiene(1))
+
+    def test_se_guarda_por_alumno(self):
+        alumno = User.objects.create_user('alumno')
+        self.assertFalse(preguntas_vistas.cargar_filtro(alumno).contiene(7))
+        preguntas_vistas.marcar_vistas(alumno, [7, 8])
+        with self.assertNumQueries(1):
+            filtro = preguntas_vistas.cargar_filtro(alumno)
+        self.assertTrue(filtro.contiene(7) and filtro.contiene(8))
+        self.assertFalse(preguntas_vistas.cargar_filtro(User.objects.create_user('otro')).contiene(7))
+
+
+class BarajadoTests(TestCase):
+    """Orden de preguntas y opciones derivado de la semilla del examen (barajado)."""
+
+    def test_barajar_es_reproducible(self):
+        elementos = list(range(50))
+        orden = barajado.barajar(elementos, 12345)
+        self.assertEqual(orden, barajado.barajar(elementos, 12345))
+        self.assertCountEqual(orden, elementos)
+        self.assertNotEqual(orden, elementos)
+        self.assertNotEqual(orden, barajado.barajar(elementos, 54321))
+        # Semilla 0: exámenes anteriores, sin barajar
+        self.assertEqual(barajado.barajar(elementos, 0), elementos)
+
+    def test_snapshot_igual_con_la_cache_fria(self):
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Tema 1')
+        preguntas = []
+        for n in range(8):
+            pregunta = Pregunta.objects.create(tema=tema, enunciado=f'Pregunta {n}')
+            Opcion.objects.bulk_create([Opcion(pregunta=pregunta, texto=f'Opción {k}') for k in range(4)])
+            preguntas.append(pregunta.id)
+        examen = Examen.objects.create(
+            usuario=User.objects.create_user('alumno'),
+            preguntas_ids=Examen.empaquetar_ids(preguntas), semilla=barajado.nueva_semilla(),
+        )
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        primero = obtener_snapshot(examen, preguntas)
+        cache.clear()
+        self.assertEqual(obtener_snapshot(examen, preguntas), primero)
+        self.assertCountEqual([p.id for p in primero], preguntas)
+        # Las opciones de cada pregunta también salen en un orden fijo por examen
+        for pregunta in primero:
+            self.assertEqual(
+                pregunta.opciones,
+                tuple(barajado.barajar(sorted(pregunta.opciones), examen.semilla ^ barajado.mezclar64(pregunta.id))),
+            )
+
+
+class ReservaExamenesTests(TestCase):
+    """Reserva de selecciones pre-generadas (reservas), sin hilo de relleno."""
+
+    @classmethod
+    def setUpTestData(cls):
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        cls.tema = Tema.objects.create(curso=curso, materia='CABO', numero_tema=1, nombre='Tema 1')
+        Pregunta.objects.bulk_create([Pregunta(tema=cls.tema, enunciado=f'Pregunta {n}') for n in range(20)])
+
+    def setUp(self):
+        aislar_estado(self)
+        self.reserva = reservas.ReservaExamenes(2)
+        # El relleno se pide, pero se hace a mano en el test
+        parche = mock.patch.object(self.reserva, '_pedir_relleno')
+        self.pedir_relleno = parche.start()
+        self.addCleanup(parche.stop)
+        self.config = self.reserva.configuracion([self.tema.id], 5, 'mixta')
+
+    def test_fallo_en_frio_pide_relleno(self):
+        self.assertIsNone(self.reserva.sacar([self.tema.id], 5, 'mixta'))
+        self.pedir_relleno.assert_called_once_with(self.config)
+        self.assertEqual(self.reserva.estado()['fallos'], 1)
+
+    def test_acierto_tras_rellenar(self):
+        self.reserva.rellenar(self.config)
+        colas = self.reserva.estado()['reservas_worker']
+        self.assertEqual(colas, {f'temas=[{self.tema.id}] cantidad=5 dificultad=mixta': 2})
+
+        seleccion = self.reserva.sacar([self.tema.id], 5, 'mixta')
+        self.assertEqual(len(set(seleccion)), 5)
+        self.assertIsNotNone(self.reserva.sacar([self.tema.id], 5, 'mixta', evitar=lambda p: False))
+        self.assertIsNone(self.reserva.sacar([self.tema.id], 5, 'mixta'))  # Cola agotada
+
+        estado = self.reserva.estado()
+        self.assertEqual((estado['aciertos'], estado['fallos'], estado['tasa_aciertos']), (2, 1, 0.667))
+
+    def test_seleccion_muy_vista_vuelve_a_la_cola(self):
+        self.reserva.rellenar(self.config)
+        self.assertIsNone(self.reserva.sacar([self.tema.id], 5, 'mixta', evitar=lambda p: True))
+        self.assertEqual(len(self.reserva._colas[self.config]), 2)
+        self.assertEqual(self.reserva.estado()['fallos'], 1)
+
+    def test_colas_caducan(self):
+        self.reserva.rellenar(self.config)
+        self.reserva._vaciadas_en -= muestreo.INDICE_MAX_EDAD
+        self.assertIsNone(self.reserva.sacar([self.tema.id], 5, 'mixta'))
+
+    def test_cambio_del_banco_vacia_las_colas(self):
+        self.reserva.rellenar(self.config)
+        Pregunta.objects.create(tema=self.tema, enunciado='Nueva')
+        self.assertIsNone(self.reserva.sacar([self.tema.id], 5, 'mixta'))
+
+    def test_tamano_cero_no_pide_relleno(self):
+        apagada = reservas.ReservaExamenes(0)
+        with mock.patch.object(apagada, '_pedir_relleno') as pedir_relleno:
+            self.assertIsNone(apagada.sacar([self.tema.id], 5, 'mixta'))
+        pedir_relleno.assert_not_called()
+
+
+class MantenimientoTests(TestCase):
+    """Tareas del barrendero y de los comandos de mantenimiento (mantenimiento.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alumno = User.objects.create_user('alumno')
+
+    def setUp(self):
+        aislar_estado(self)
+        hace_dos_dias = timezone.now() - timedelta(days=2)
+        self.viejos = [Examen.objects.create(usuario=self.alumno).id for _ in range(3)]
+        self.entregado = Examen.objects.create(usuario=self.alumno, completado=True).id
+        Examen.objects.filter(id__in=[*self.viejos, self.entregado]).update(fecha=hace_dos_dias)
+        self.reciente = Examen.objects.create(usuario=self.alumno).id
+
+    def test_purga_solo_los_abandonados_por_lotes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            borrados = purgar_examenes_abandonados(edad=timedelta(hours=24), lote=2)
+
+        self.assertEqual(borrados, 3)
+        self.assertEqual(set(Examen.objects.values_list('id', flat=True)), {self.entregado, self.reciente})
+        borrados_por_sentencia = [
+            q['sql'] for q in consultas.captured_queries if q['sql'].startswith('DELETE FROM "simulador_examen"')
+        ]
+        self.assertEqual(len(borrados_por_sentencia), 2)
+
+    def test_comando_informa_del_total(self):
+        salida = StringIO()
+        call_command('limpiar_examenes_abandonados', '--dry-run', stdout=salida)
+        self.assertIn('Exámenes abandonados de más de 24h: 3', salida.getvalue())
+        self.assertEqual(Examen.objects.count(), 5)
+
+        call_command('limpiar_examenes_abandonados', '--lote', '2', stdout=salida)
+        self.assertIn('Exámenes abandonados eliminados (más de 24h): 3', salida.getvalue())
+        self.assertEqual(Examen.objects.count(), 2)
+
+
+class ResumenesTests(TestCase):
+    """Resúmenes diarios de actividad (resumenes.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alumnos = [User.objects.create_user(f'alumno{n}') for n in range(2)]
+
+    def setUp(self):
+        aislar_estado(self)
+
+    def _resultado(self, usuario, fecha, nota, preguntas=10):
+        resultado = Resultado.objects.create(usuario=usuario, nota=nota, aciertos=preguntas, fallos=0, blancos=0)
+        momento = timezone.make_aware(datetime.combine(fecha, datetime.min.time()) + timedelta(hours=10))
+        Resultado.objects.filter(id=resultado.id).update(fecha=momento)
+
+    def _filas(self):
+        return sorted(
+            ResumenDiario.objects.values_list('fecha', 'usuario_id', 'tests', 'suma_notas', 'nota_media', 'preguntas'),
+            key=lambda fila: (fila[0], fila[1] or 0),
+        )
+
+    def test_resumir_dos_veces_no_cambia_nada(self):
+        dia = date(2026, 10, 15)
+        uno, otro = self.alumnos
+        self._resultado(uno, dia, 6)
+        self._resultado(uno, dia, 8)
+        self._resultado(otro, dia, 5, preguntas=20)
+
+        self.assertEqual(resumenes.resumir_dia(dia), 2)
+        primera = self._filas()
+        self.assertEqual(resumenes.resumir_dia(dia), 2)
+
+        self.assertEqual(self._filas(), primera)
+        self.assertEqual(primera, [
+            (dia, None, 3, 19.0, 19.0 / 3, 40),
+            (dia, uno.id, 2, 14.0, 7.0, 20),
+            (dia, otro.id, 1, 5.0, 5.0, 20),
+        ])
+
+    def test_pendientes_hasta_ayer(self):
+        uno = self.alumnos[0]
+        self._resultado(uno, date(2026, 10, 15), 7)
+        self._resultado(uno, date(2026, 10, 18), 9)
+
+        with mock.patch.object(resumenes.timezone, 'localdate', return_value=date(2026, 10, 18)):
+            self.assertEqual(resumenes.dias_pendientes(), [date(2026, 10, 15), date(2026, 10, 16), date(2026, 10, 17)])
+            self.assertEqual(resumenes.resumir_pendientes(), 3)
+            self.assertEqual(resumenes.dias_pendientes(), [])
+
+        # Los días sin actividad quedan marcados con su fila global a cero; hoy aún no se resume
+        self.assertEqual(
+            list(ResumenDiario.objects.filter(usuario=None).order_by('fecha').values_list('fecha', 'tests')),
+            [(date(2026, 10, 15), 1), (date(2026, 10, 16), 0), (date(2026, 10, 17), 0)],
+        )
+
+        with mock.patch.object(resumenes.timezone, 'localdate', return_value=date(2026, 10, 19)):
+            self.assertEqual(resumenes.dias_pendientes(), [date(2026, 10, 18)])
+
+
+class CatalogoTests(TestCase):
+    """Contador desnormalizado Tema.num_preguntas (señales de Pregunta y catalogo.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        curso = Curso.objects.create(nombre='Ascenso a Cabo')
+        cls.origen, cls.destino = (
+            Tema.objects.create(curso=curso, materia='CABO', numero_tema=n, nombre=f'Tema {n}') for n in (1, 2)
+        )
+
+    def setUp(self):
+        aislar_estado(self)
+
+    def _contadores(self):
+        return list(Tema.objects.order_by('numero_tema').values_list('num_preguntas', flat=True))
+
+    def test_alta_cambio_de_tema_y_baja(self):
+        primera = Pregunta.objects.create(tema=self.origen, enunciado='Primera')
+        Pregunta.objects.create(tema=self.origen, enunciado='Segunda')
+        self.assertEqual(self._contadores(), [2, 0])
+
+        primera.tema = self.destino
+        primera.save()
+        self.assertEqual(self._contadores(), [1, 1])
+
+        primera.delete()
+        self.assertEqual(self._contadores(), [1, 0])
+
+    def test_guardar_sin_el_tema_no_lo_consulta(self):
+        pregunta = Pregunta.objects.create(tema=self.origen, enunciado='Pregunta')
+        pregunta.tema = self.destino
+        pregunta.save()
+
+        pregunta.enunciado = 'Pregunta corregida'
+        with CaptureQueriesContext(connection) as consultas:
+            pregunta.save(update_fields=['enunciado'])
+        self.assertEqual([q['sql'].split()[0] for q in consultas.captured_queries], ['UPDATE'])
+        # El tema anterior del guardado previo no se vuelve a descontar
+        self.assertEqual(self._contadores(), [0, 1])
+
+        pregunta.tema = self.origen
+        pregunta.save(update_fields=['tema'])
+        self.assertEqual(self._contadores(), [1, 0])
+
+    def test_recontar_repara_el_contador(self):
+        Pregunta.objects.create(tema=self.origen, enunciado='Pregunta')
+        Tema.objects.update(num_preguntas=7)
+
+        salida = StringIO()
+        call_command('recontar_preguntas', stdout=salida)
+        self.assertEqual(self._contadores(), [1, 0])
+        self.assertIn('Temas corregidos: 2', salida.getvalue())
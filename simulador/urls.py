@@ -29,7 +29,9 @@ urlpatterns = [
     path('generar-test/', views.generar_test, name='generar_test'),
     path('examen/', views.examen, name='examen'),
     path('examen/<int:examen_id>/', views.ver_examen, name='ver_examen'),
+    path('examen/<int:examen_id>/comprobar/', views.comprobar_respuesta, name='comprobar_respuesta'),
     path('resultado/<int:resultado_id>/', views.resultado, name='resultado'),
+    path('estado/reservas/', views.estado_reservas, name='estado_reservas'),
 
     # 5. PASARELA DE PAGOS (Redsys)
     path('pagos/iniciar/', views.iniciar_pago, name='iniciar_pago'),
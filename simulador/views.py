@@ -1,18 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
 from django.contrib import messages 
 from django.http import HttpResponse, Http404, HttpResponseForbidden, FileResponse, JsonResponse
 from django.conf import settings
-from .models import Tema, Pregunta, Examen, Opcion, Resultado, Perfil, Curso, HistorialDescuento, DocumentoContexto
+from academia_project.db_routers import lecturas_analiticas
+from .models import Tema, Pregunta, Examen, Opcion, Resultado, Perfil, Curso, HistorialDescuento, EstadisticasUsuario
 from .redsys_payment import RedsysPayment
+from .motor_examen import (
+    corregir_examen, corregir_pregunta, congelar_clave, obtener_snapshot,
+    olvidar_practica, preparar_practica, registrar_entrega, respuestas_practica, revision_examen,
+)
+from .muestreo import muestrear, MEZCLAS_DIFICULTAD
+from .mantenimiento import edad_abandono
+from .planes import limites_para
+from .reservas import reserva_examenes
+from .debilidades import seleccionar_repaso, puntos_debiles
+from .preguntas_vistas import cargar_filtro
+from .barajado import nueva_semilla
+from .estadisticas_alumno import resumen_materias
+from .resumenes import actividad_usuario
+from .catalogo import temas_por_materia
+from .indice_texto import buscar, tokenizar
+from .clasificacion import (
+    top, mi_posicion, total_alumnos, ventana_desde, top_periodo, posicion_periodo,
+    fila_escalafon, escalafon_top, posicion_escalafon, total_escalafon,
+)
 
-import random
 import logging
 import os
 import hashlib
@@ -148,8 +168,17 @@ def portada(request):
     dias_restantes = max(0, dias_prueba - diferencia.days)
     esta_en_prueba = (perfil.cursos_activos.count() == 0)
 
-    ranking = Perfil.objects.select_related("usuario").order_by("-preguntas_respondidas")[:50]
-    mi_posicion = Perfil.objects.filter(preguntas_respondidas__gt=perfil.preguntas_respondidas).count() + 1
+    # Clasificación mantenida de forma incremental (ver clasificacion.py);
+    # con ?ventana=semana|mes se lee el cubo del periodo en curso
+    ventana = request.GET.get("ventana")
+    tipo_ventana = ventana_desde(ventana)
+    with lecturas_analiticas():
+        if tipo_ventana:
+            ranking = top_periodo(tipo_ventana)
+            posicion = posicion_periodo(request.user, tipo_ventana)
+        else:
+            ranking = top()
+            posicion = mi_posicion(perfil)
 
     site_url = request.build_absolute_uri('/').rstrip('/')
     referral_link = f"{site_url}/registro/?ref={perfil.codigo_referido}"
@@ -170,7 +199,8 @@ def portada(request):
         "perfil": perfil,
         "es_premium": perfil.es_premium,
         "ranking": ranking,
-        "mi_posicion": mi_posicion,
+        "mi_posicion": posicion,
+        "ventana": ventana if tipo_ventana else "total",
         "referral_code": perfil.codigo_referido,
         "referral_link": referral_link,
         "saldo_descuento": perfil.descuento_acumulado,
@@ -200,16 +230,33 @@ def perfil(request):
 @login_required
 def estadisticas(request):
     perfil, created = Perfil.objects.get_or_create(usuario=request.user)
-    intentos = Resultado.objects.filter(usuario=request.user)
-    
-    context = {
-        "perfil": perfil,
-        "total_intentos": intentos.count(),
-        "promedio_nota": round(intentos.aggregate(Avg("nota"))["nota__avg"] or 0, 2),
-        "total_preguntas": perfil.preguntas_respondidas,
-        "datos_grafico": intentos.order_by("fecha")[:10],
-        "ranking": Perfil.objects.select_related("usuario").order_by("-preguntas_respondidas")[:50],
-    }
+    # Lecturas de solo consulta: van a la réplica si la hay (ver db_routers.py)
+    with lecturas_analiticas():
+        # Resumen precalculado en cada entrega: una lectura por clave primaria
+        stats = EstadisticasUsuario.objects.filter(usuario=request.user).first() or EstadisticasUsuario(usuario=request.user)
+        datos_grafico = [
+            dict(intento, fecha=datetime.fromisoformat(intento["fecha"]))
+            for intento in stats.ultimas
+        ]
+        # Puntos débiles: índice precalculado por tema y por pregunta
+        temas_debiles, preguntas_debiles = puntos_debiles(request.user)
+    
+        context = {
+            "perfil": perfil,
+            "total_intentos": stats.intentos,
+            "promedio_nota": round(stats.nota_media, 2),
+            "mejor_nota": round(stats.mejor_nota, 2),
+            "total_preguntas": perfil.preguntas_respondidas,
+            "datos_grafico": datos_grafico,
+            "por_materia": resumen_materias(stats),
+            "temas_debiles": temas_debiles,
+            "preguntas_debiles": preguntas_debiles,
+            # Actividad por día: filas de ResumenDiario (comando resumir_actividad_diaria)
+            "actividad_diaria": actividad_usuario(request.user),
+            "ranking": top(),
+            "mi_posicion": mi_posicion(perfil),
+            "total_alumnos": total_alumnos(),
+        }
     return render(request, "simulador/estadisticas.html", context)
 
 
@@ -218,60 +265,44 @@ def escalafon(request):
     """Vista del Escalafón de Alumnos - Ranking por nota media"""
     perfil, created = Perfil.objects.get_or_create(usuario=request.user)
     
-    # Obtener ranking de usuarios con al menos 1 test completado
-    ranking_completo = (
-        Resultado.objects
-        .values('usuario__username', 'usuario__id')
-        .annotate(
-            nota_media=Avg('nota'),
-            tests_completados=Count('id')
-        )
-        .filter(tests_completados__gte=1)
-        .order_by('-nota_media')
-    )
-    
-    # Top 10 general (para todos)
-    top_10 = list(ranking_completo[:10])
-    
-    # Posición del usuario actual
-    posicion_usuario = None
-    nota_media_usuario = None
-    tests_usuario = 0
-    
-    for i, item in enumerate(ranking_completo, 1):
-        if item['usuario__id'] == request.user.id:
-            posicion_usuario = i
-            nota_media_usuario = round(item['nota_media'], 2)
-            tests_usuario = item['tests_completados']
-            break
-    
-    # Generar alias para cada usuario
-    def generar_alias(username, user_id):
-        """Genera un alias semi-anónimo"""
-        primera = username[0].upper() if username else 'A'
-        ultima = username[-1].upper() if username else 'Z'
-        numero = (user_id % 100)
-        return f"{primera}***{ultima}_{numero}"
-    
-    # Preparar datos con alias y posiciones
-    ranking_con_posicion = []
-    for i, item in enumerate(top_10, 1):
-        ranking_con_posicion.append({
-            'posicion': i,
-            'alias': generar_alias(item['usuario__username'], item['usuario__id']),
-            'nota_media': round(item['nota_media'], 2),
-            'tests_completados': item['tests_completados'],
-            'es_usuario': item['usuario__id'] == request.user.id,
-        })
-    
-    context = {
-        'perfil': perfil,
-        'ranking': ranking_con_posicion,
-        'posicion_usuario': posicion_usuario,
-        'nota_media_usuario': nota_media_usuario,
-        'tests_usuario': tests_usuario,
-        'total_participantes': ranking_completo.count(),
-    }
+    # Lecturas de solo consulta: van a la réplica si la hay (ver db_routers.py)
+    with lecturas_analiticas():
+        # Escalafón materializado: una fila por alumno con al menos 1 test completado
+        # (histórico, o de la semana/mes en curso con ?ventana=semana|mes)
+        ventana = request.GET.get("ventana")
+        tipo_ventana = ventana_desde(ventana)
+        mi_fila = fila_escalafon(request.user, tipo_ventana)
+    
+        # Posición del usuario actual (COUNT sobre el índice de nota_media)
+        posicion_usuario = None
+        nota_media_usuario = None
+        tests_usuario = 0
+    
+        if mi_fila:
+            posicion_usuario = posicion_escalafon(mi_fila, tipo_ventana)
+            nota_media_usuario = round(mi_fila.nota_media, 2)
+            tests_usuario = mi_fila.tests
+    
+        # Top 10 general (para todos), con el alias ya precalculado
+        ranking_con_posicion = []
+        for i, fila in enumerate(escalafon_top(10, tipo_ventana), 1):
+            ranking_con_posicion.append({
+                'posicion': i,
+                'alias': fila.alias,
+                'nota_media': round(fila.nota_media, 2),
+                'tests_completados': fila.tests,
+                'es_usuario': fila.usuario_id == request.user.id,
+            })
+    
+        context = {
+            'perfil': perfil,
+            'ranking': ranking_con_posicion,
+            'posicion_usuario': posicion_usuario,
+            'nota_media_usuario': nota_media_usuario,
+            'tests_usuario': tests_usuario,
+            'total_participantes': total_escalafon(tipo_ventana),
+            'ventana': ventana if tipo_ventana else 'total',
+        }
     
     return render(request, 'simulador/escalafon.html', context)
 
@@ -324,14 +355,15 @@ def plan_premium(request):
 
 @login_required
 def configurar_test(request):
-    # Solo mostramos en pantalla los temas que tienen 1 o más preguntas.
-    temas_con_preguntas = Tema.objects.annotate(num_preguntas=Count('preguntas')).filter(num_preguntas__gt=0)
+    # Solo mostramos en pantalla los temas que tienen 1 o más preguntas
+    # (contador Tema.num_preguntas, una consulta cacheada; ver catalogo.py)
+    temas = temas_por_materia()
     
     context = {
-        "temas_cabo": temas_con_preguntas.filter(Q(materia="CABO") | Q(materia__isnull=True)),
-        "temas_ingles": temas_con_preguntas.filter(materia="INGLÉS"),
-        "temas_geografia": temas_con_preguntas.filter(materia="GEOGRAFÍA"),
-        "temas_informatica": temas_con_preguntas.filter(materia="INFORMÁTICA"),
+        "temas_cabo": temas["CABO"],
+        "temas_ingles": temas["INGLÉS"],
+        "temas_geografia": temas["GEOGRAFÍA"],
+        "temas_informatica": temas["INFORMÁTICA"],
     }
     return render(request, "simulador/configurar_test.html", context)
 
@@ -339,113 +371,161 @@ def configurar_test(request):
 def generar_test(request):
     if request.method == "POST":
         temas_ids = request.POST.getlist("temas")
-        cantidad = int(request.POST.get("cantidad", 10))
+        # El tamaño del examen lo fija el plan del alumno una sola vez, aquí
+        limites = limites_para(request.user.perfil)
+        pedidas = int(request.POST.get("cantidad", 10))
+        cantidad = limites.ajustar_cantidad(pedidas)
         
         # 1. Evitar colapsos si no marcan nada
         if not temas_ids:
             messages.warning(request, "⚠️ No has seleccionado ningún tema. Marca al menos una casilla de instrucción.")
             return redirect("configurar_test")
         
-        preguntas_pool = list(Pregunta.objects.filter(tema_id__in=temas_ids))
+        # Primero se tira de la reserva pre-generada de las configuraciones populares;
+        # si no hay, se muestrean ids del índice en memoria (sin cargar enunciados)
+        dificultad = request.POST.get("dificultad", "mixta")
+        if dificultad not in MEZCLAS_DIFICULTAD:
+            dificultad = "mixta"
+        if request.POST.get("repaso_fallos"):
+            # Repaso: las preguntas que más falla el alumno, del índice de puntos débiles
+            seleccionadas = seleccionar_repaso(request.user, temas_ids, cantidad)
+            if not seleccionadas:
+                messages.info(request, "✅ No tienes fallos registrados en esos temas. ¡Haz un test normal primero!")
+                return redirect("configurar_test")
+        else:
+            # Se prefieren preguntas que el alumno no haya visto recientemente
+            vistas = cargar_filtro(request.user)
+            seleccionadas = reserva_examenes.sacar(temas_ids, cantidad, dificultad, evitar=vistas.contiene)
+            if not seleccionadas:
+                seleccionadas = muestrear(temas_ids, cantidad, MEZCLAS_DIFICULTAD[dificultad], evitar=vistas.contiene)
         
+        # El índice de ids de un worker puede ir por detrás de la base de datos:
+        # la clave solo incluye preguntas que existen y el examen se hace con esas
+        clave = congelar_clave(seleccionadas)
+        seleccionadas = [pregunta_id for pregunta_id in seleccionadas if str(pregunta_id) in clave]
+
         # 2. Seguro antifallos de Base de Datos
-        if not preguntas_pool:
+        if not seleccionadas:
             messages.error(request, "❌ No hay preguntas en la base de datos para los temas seleccionados. Ejecuta /sincronizar/")
             return redirect("configurar_test")
 
-        # FIX TÁCTICO: Purgar exámenes zombies (a medias) antes de crear uno nuevo
-        Examen.objects.filter(usuario=request.user, completado=False).delete()
-
-        cantidad = min(len(preguntas_pool), cantidad)
-        seleccionadas = random.sample(preguntas_pool, cantidad)
-
-        # 3. Creación Segura
-        nuevo_examen = Examen.objects.create(usuario=request.user)
-        nuevo_examen.preguntas.add(*seleccionadas) # Mucho más robusto en SQLite que set()
+        # Los exámenes a medias anteriores se quedan: los borra el barrendero
+        # (limpiar_examenes_abandonados) fuera del camino de la petición.
+        # 3. Creación Segura: preguntas en orden, empaquetadas, y clave congelada (una sola fila)
+        nuevo_examen = Examen.objects.create(
+            usuario=request.user,
+            preguntas_ids=Examen.empaquetar_ids(seleccionadas),
+            clave_respuestas=clave,
+            semilla=nueva_semilla(),
+            # Sin "Modo Examen" marcado, cada respuesta se corrige al momento
+            modo="EXAMEN" if request.POST.get("modo_examen") else "PRACTICA"
+        )
         
         # 4. Verificación de Integridad
-        if nuevo_examen.preguntas.count() == 0:
+        if not nuevo_examen.preguntas_ids:
             nuevo_examen.delete()
             messages.error(request, "Fallo crítico en la armería: El simulacro se ha generado vacío. Inténtalo de nuevo.")
             return redirect("configurar_test")
+
+        # El aviso de la demo solo sale en el examen que de verdad se ha recortado
+        if cantidad < pedidas:
+            request.session["examen_recortado"] = nuevo_examen.id
+        else:
+            request.session.pop("examen_recortado", None)
             
         return redirect("ver_examen", examen_id=nuevo_examen.id)
         
     return redirect("configurar_test")
 
+@staff_member_required
+def estado_reservas(request):
+    """Aciertos/fallos de la reserva de exámenes pre-generados (solo staff)."""
+    return JsonResponse(reserva_examenes.estado())
+
 @login_required
 def ver_examen(request, examen_id):
     examen_obj = get_object_or_404(Examen, id=examen_id, usuario=request.user)
     perfil = request.user.perfil
     es_premium = perfil.es_premium
+    # Solo lectura: el recorte por plan ya se aplicó al generar el examen
+    limites = limites_para(perfil)
     
-    MAX_PREGUNTAS_FREE = 10
+    preguntas_ids = examen_obj.ids_preguntas
     
-    total_preguntas = examen_obj.preguntas.count()
-    mostrar_aviso_free = False
-    
-    if not es_premium and total_preguntas > MAX_PREGUNTAS_FREE:
-        preguntas_limite = list(examen_obj.preguntas.all()[:MAX_PREGUNTAS_FREE])
-        examen_obj.preguntas.set(preguntas_limite)
-        mostrar_aviso_free = True
-    
-    if examen_obj.preguntas.count() == 0:
+    if not preguntas_ids:
         examen_obj.delete()
         messages.warning(request, "⚠️ Has entrado en un simulacro corrupto o antiguo. Ha sido purgado, genera uno nuevo por favor.")
         return redirect("configurar_test")
     
     if request.method == "POST":
-        aciertos = 0
-        total = examen_obj.preguntas.count()
-        
-        for pregunta in examen_obj.preguntas.all():
-            respuesta_id = request.POST.get(f"pregunta_{pregunta.id}")
-            if respuesta_id:
-                try:
-                    opcion = Opcion.objects.get(id=respuesta_id, pregunta=pregunta)
-                    if opcion.es_correcta:
-                        aciertos += 1
-                except Opcion.DoesNotExist:
-                    pass
-        
-        nota = (aciertos / total * 10) if total > 0 else 0
-        examen_obj.completado = True
-        examen_obj.save()
-
-        perfil.preguntas_respondidas += total
-        perfil.save()
-        perfil.comprobar_ascenso()
-
-        res = Resultado.objects.create(
-            usuario=request.user,
-            examen=examen_obj,
-            nota=nota,
-            aciertos=aciertos,
-            fallos=total - aciertos
-        )
+        if examen_obj.modo == "PRACTICA":
+            # En práctica cuenta lo que se comprobó en el servidor, no lo que reenvía el formulario
+            respuestas = respuestas_practica(examen_obj.id, preguntas_ids)
+        else:
+            respuestas = request.POST
+        correccion = corregir_examen(examen_obj, respuestas, preguntas_ids)
+        res = registrar_entrega(examen_obj, request.user, correccion)
+
+        if res is not None and examen_obj.modo == "PRACTICA":
+            olvidar_practica(examen_obj.id, preguntas_ids)
+        if res is None:
+            # Doble envío (otra pestaña o doble clic): el examen ya estaba entregado
+            res = Resultado.objects.filter(examen=examen_obj).first()
+            if res is None:
+                return redirect("configurar_test")
         return redirect("resultado", resultado_id=res.id)
 
+    # En modo práctica se deja lista en caché la corrección pregunta a pregunta
+    if examen_obj.modo == "PRACTICA" and not examen_obj.completado:
+        preparar_practica(examen_obj, preguntas_ids)
+
+    # Render desde el snapshot cacheado: recargar el examen no consulta el catálogo
     return render(request, "simulador/examen.html", {
         "examen": examen_obj, 
+        "preguntas": obtener_snapshot(examen_obj, preguntas_ids),
+        "tiempo_limite": 0,
         "es_premium": es_premium, 
-        "max_preguntas": MAX_PREGUNTAS_FREE if not es_premium else None,
-        "mostrar_aviso_free": mostrar_aviso_free
+        "num_preguntas": len(preguntas_ids),
+        "mostrar_aviso_free": limites.es_limitado and request.session.get("examen_recortado") == examen_obj.id,
     })
 
+@login_required
+@require_POST
+def comprobar_respuesta(request, examen_id):
+    """Modo práctica: corrige una pregunta al momento desde la caché y apunta la respuesta."""
+    try:
+        pregunta_id = int(request.POST.get("pregunta"))
+        opcion_id = int(request.POST.get("opcion"))
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Petición no válida"}, status=400)
+
+    respuesta = corregir_pregunta(examen_id, request.user.id, pregunta_id, opcion_id)
+    if respuesta is None:
+        return JsonResponse({"error": "Pregunta no encontrada"}, status=404)
+    return JsonResponse(respuesta)
+
 @login_required
 def examen(request):
-    # Purgar cualquier zombie que haya quedado flotando antes de intentar redirigir
-    Examen.objects.filter(usuario=request.user, completado=False, preguntas__isnull=True).delete()
-    
-    ultimo = Examen.objects.filter(usuario=request.user, completado=False).last()
-    if ultimo and ultimo.preguntas.count() > 0:
+    # Retomar el último examen a medias; los vacíos o abandonados se ignoran
+    # (el barrendero los borra en segundo plano)
+    ultimo = (
+        Examen.objects
+        .filter(usuario=request.user, completado=False, fecha__gte=timezone.now() - edad_abandono())
+        .exclude(preguntas_ids=b'')
+        .order_by('-id')
+        .only('id')
+        .first()
+    )
+    if ultimo:
         return redirect("ver_examen", examen_id=ultimo.id)
     return redirect("configurar_test")
 
 @login_required
 def resultado(request, resultado_id):
-    res = get_object_or_404(Resultado, id=resultado_id, usuario=request.user)
-    return render(request, "simulador/resultado.html", {"resultado": res})
+    res = get_object_or_404(Resultado.objects.select_related("examen"), id=resultado_id, usuario=request.user)
+    # Revisión pregunta a pregunta en el mismo orden en que se hizo el examen
+    revision = revision_examen(res.examen) if res.examen else []
+    return render(request, "simulador/resultado.html", {"resultado": res, "revision": revision})
 
 # --- 4. TEMARIO Y MP3 ---
 
@@ -760,59 +840,6 @@ def extraer_frases_relevantes(texto, pregunta, num_frases=3):
     return " ".join(mejores_frases[:num_frases])
 
 
-def extraer_parrafos_relevantes(texto, palabras_clave, max_chars=1200):
-    """
-    Extrae párrafos completos que contengan las palabras clave.
-    Busca artículos completos (delimitados por 'Artículo' o 'Art.') o párrafos.
-    Elimina 'paja' que no contenga keywords.
-    """
-    if not texto or not palabras_clave:
-        return ""
-    
-    texto_lower = texto.lower()
-    parrafos_encontrados = []
-    
-    # Dividir por párrafos (doble salto de línea o bloque de artículo)
-    bloques = re.split(r'\n\s*\n|(?:Artículo|Art\.?\s*\d+[.:])', texto)
-    
-    for bloque in bloques:
-        bloque = bloque.strip()
-        if len(bloque) < 50:
-            continue
-        
-        bloque_lower = bloque.lower()
-        
-        # Verificar si contiene alguna palabra clave
-        contiene_keyword = False
-        for kw in palabras_clave:
-            if len(kw) >= 4 and kw in bloque_lower:
-                contiene_keyword = True
-                break
-        
-        if contiene_keyword:
-            # Limpiar el bloque de ruido
-            bloque_limpio = limpiar_texto_manual(bloque)
-            if len(bloque_limpio) >= 50:
-                parrafos_encontrados.append(bloque_limpio)
-    
-    # Unir los párrafos encontrados hasta max_chars
-    resultado = []
-    total_chars = 0
-    
-    for p in parrafos_encontrados:
-        if total_chars + len(p) <= max_chars:
-            resultado.append(p)
-            total_chars += len(p)
-        else:
-            # Si ya no cabe completo, intentar cortar por oración
-            remaining = max_chars - total_chars
-            if remaining > 100:
-                resultado.append(p[:remaining])
-            break
-    
-    return "\n\n".join(resultado)
-
-
 def limpiar_texto_manual(texto):
     """Limpia el texto eliminando títulos, índices y ruido."""
     resultado = texto
@@ -875,83 +902,32 @@ def chat_ia(request):
             
             contexto_relevante = ""
             fuentes_utilizadas = []
-            ranking_scores = []
-            
-            # Extraer palabras clave de la pregunta
-            palabras_pregunta = pregunta_alumno.lower().split()
-            stop_words = {'el', 'la', 'los', 'las', 'de', 'en', 'que', 'es', 'un', 'una', 'por', 'para', 'con', 'sin', 'sobre', 'y', 'a', 'o', 'cual', 'cuantos', 'cuantas', 'qué', 'cómo', 'cuando', 'dónde'}
-            palabras_clave = [p for p in palabras_pregunta if len(p) > 3 and p not in stop_words]
-            
+
+            # Palabras clave de la pregunta, tal como las usa el índice (sin tildes ni stop words)
+            palabras_clave = tokenizar(pregunta_alumno)
             logger.info(f"[IA DEBUG] Palabras clave: {palabras_clave}")
-            
-            # 1. Buscar en Documentos de Contexto (PDFs/TXTs subidos)
-            documentos = DocumentoContexto.objects.filter(
-                curso__in=cursos_alumno,
-                activo=True,
-                contenido_texto__isnull=False
-            ).exclude(contenido_texto='')
-            
-            for doc in documentos:
-                contenido_lower = doc.contenido_texto.lower()
-                nombre_lower = doc.nombre.lower()
-                
-                # Calcular puntuación por palabras clave en título y contenido
-                score = 0
-                palabras_encontradas = 0
-                for palabra in palabras_clave:
-                    if palabra in nombre_lower:
-                        score += 15  # Mucho peso si está en el título
-                        palabras_encontradas += 1
-                    if palabra in contenido_lower:
-                        score += 3
-                        palabras_encontradas += 1
-                
-                if score > 0 and len(doc.contenido_texto) >= 100:
-                    ranking_scores.append({
-                        'doc': doc,
-                        'score': score,
-                        'palabras': palabras_encontradas,
-                        'nombre': doc.nombre,
-                        'chars': len(doc.contenido_texto)
-                    })
-            
-            # Ordenar por puntuación y tomar SOLO los 2 mejores
-            ranking_scores.sort(key=lambda x: (x['score'], x['palabras']), reverse=True)
-            top_documentos = ranking_scores[:2]
-            
-            logger.info(f"[IA DEBUG] Ranking de documentos (top 2): {[(d['nombre'][:30], d['score'], d['chars']) for d in top_documentos]}")
-            
-            # Usar extracción por párrafos completos
-            for item in top_documentos:
-                doc = item['doc']
-                
-                # Extraer SOLO párrafos que contengan palabras clave
-                parrafos = extraer_parrafos_relevantes(
-                    doc.contenido_texto,
-                    palabras_clave,
-                    max_chars=1000
-                )
-                
-                if parrafos and len(parrafos) >= 50:
-                    contexto_relevante += parrafos + "\n\n"
-                    fuentes_utilizadas.append(f"Documento: {doc.nombre}")
-                    logger.info(f"[IA DEBUG] ✓ {doc.nombre[:40]}: score={item['score']}, chars={len(parrafos)}")
-                    logger.info(f"[IA DEBUG] Contenido: {parrafos[:300]}...")
-            
-            # Si no hay documentos con ranking, buscar en Temas
-            if not fuentes_utilizadas:
-                temas_del_curso = Tema.objects.filter(materia="CABO", contenido_texto__isnull=False).exclude(contenido_texto='')
-                
-                for tema in temas_del_curso:
-                    if tema.contenido_texto and len(tema.contenido_texto) >= 100:
-                        parrafos = extraer_parrafos_relevantes(
-                            tema.contenido_texto,
-                            palabras_clave,
-                            max_chars=800
-                        )
-                        if parrafos and len(parrafos) >= 50:
-                            contexto_relevante += f"{parrafos}\n\n"
-                            fuentes_utilizadas.append(f"Tema: {tema.nombre}")
+
+            # 1. Pasajes de los Documentos de Contexto (PDFs/TXTs subidos) de los cursos del alumno;
+            #    si no hay ninguno, pasajes de los Temas de CABO
+            coincidencias = buscar(pregunta_alumno, cursos_ids=[c.id for c in cursos_alumno])
+            if not coincidencias:
+                coincidencias = buscar(pregunta_alumno, materia="CABO")
+
+            logger.info(f"[IA DEBUG] Ranking BM25: {[(c.pasaje.id, round(c.puntuacion, 2)) for c in coincidencias]}")
+
+            for coincidencia in coincidencias:
+                pasaje = coincidencia.pasaje
+                texto = limpiar_texto_manual(pasaje.texto)
+                if len(contexto_relevante) + len(texto) > 2000 and contexto_relevante:
+                    break
+                contexto_relevante += texto + "\n\n"
+                if pasaje.documento_id:
+                    fuente = f"Documento: {pasaje.documento.nombre}"
+                else:
+                    fuente = f"Tema: {pasaje.tema.nombre}"
+                if fuente not in fuentes_utilizadas:
+                    fuentes_utilizadas.append(fuente)
+                logger.info(f"[IA DEBUG] ✓ {fuente[:50]}: score={coincidencia.puntuacion:.2f}, chars={len(texto)}")
             
             # Verificar si hay contexto con calidad mínima
             if not contexto_relevante.strip() or len(contexto_relevante.strip()) < 50: